@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Measure the import time of the coslib modules in fresh interpreters
+
+:example:
+
+python benchmarks/bench_import.py --repeat 10
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ('coslib', 'coslib.ldp', 'coslib.ttp', 'coslib.cli')
+
+# optional heavy dependencies that should only load on first use
+HEAVY = ('xlrd', 'numexpr', 'scipy', 'matplotlib')
+
+_PROBE = '''
+import sys, json, time
+start = time.time()
+{statement}
+seconds = time.time() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [
+    x for x in {heavy!r} if x in sys.modules]}}))
+'''
+
+
+def probe(statement):
+    """Time a statement in a fresh interpreter
+
+    :param statement: statement to run
+    :type statement: string
+    :return: seconds taken and heavy modules loaded
+    :rtype: dict"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ROOT, os.path.join(ROOT, 'coslib'), env.get('PYTHONPATH', '')])
+    output = subprocess.check_output(
+        [sys.executable, '-c', _PROBE.format(statement=statement,
+                                             heavy=HEAVY)], env=env)
+    return json.loads(output.decode('utf-8').splitlines()[-1])
+
+
+def main(argv=None):
+    """Run the import benchmarks and print a summary table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='fresh interpreters per module')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    for module in MODULES:
+        runs = [probe('import ' + module) for _ in range(args.repeat)]
+        seconds = min(x['seconds'] for x in runs)
+        results.append({'module': module, 'seconds': seconds,
+                        'loaded': runs[0]['loaded']})
+        print('{:<14}{:>10.1f} ms   {}'.format(
+            module, seconds*1e3, ', '.join(runs[0]['loaded']) or '-'))
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Synthetic data generators for the benchmark suite"""
+import zipfile
+from xml.sax.saxutils import escape
+import numpy as np
+
+# domain sizes of the gold standard mesh, the solid phase exports repeat the
+# interface nodes at frame rows 80 and 202 (see ttp.COMSOL_DELETE)
+NEG_NODES = 81
+SEP_NODES = 120
+
+BLOCKS = ('const', 'neg', 'sep', 'pos')
+
+UOCP = ('{(@(x)(-0.16 + 1.32*exp(-3.0*x) + 10.0*exp(-2000.0*x))),'
+        '(@(x)(-20000*exp(-2000*x) - 3.96*exp(-3*x)))}')
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'content-types">'
+    '<Default Extension="rels" ContentType="application/'
+    'vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" ContentType='
+    '"application/vnd.openxmlformats-officedocument.spreadsheetml.'
+    'worksheet+xml"/>'
+    '<Override PartName="/xl/sharedStrings.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.spreadsheetml.sharedStrings+xml"/>'
+    '</Types>')
+
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>')
+
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/'
+    'main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/'
+    'relationships">'
+    '<sheets><sheet name="Parameters" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>')
+
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/sharedStrings" '
+    'Target="sharedStrings.xml"/>'
+    '</Relationships>')
+
+_MAIN_NS = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+
+
+def _column_name(col):
+    """Convert a 0-based column number to its spreadsheet letters"""
+    name = ''
+    col += 1
+    while col:
+        (col, rem) = divmod(col-1, 26)
+        name = chr(65+rem) + name
+    return name
+
+
+def write_xlsx(filename, rows):
+    """Write rows of numbers and strings to a single-sheet xlsx workbook
+
+    :param filename: name of the workbook to write
+    :param rows: cell values, None for empty cells
+    :type filename: string
+    :type rows: list of lists"""
+    strings = dict()
+    sheet = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+             '<worksheet xmlns="%s"><sheetData>' % _MAIN_NS]
+    for (xpos, row) in enumerate(rows):
+        sheet.append('<row r="%d">' % (xpos+1))
+        for (ypos, value) in enumerate(row):
+            ref = '%s%d' % (_column_name(ypos), xpos+1)
+            if value is None:
+                continue
+            elif isinstance(value, str):
+                index = strings.setdefault(value, len(strings))
+                sheet.append('<c r="%s" t="s"><v>%d</v></c>' % (ref, index))
+            else:
+                sheet.append('<c r="%s"><v>%r</v></c>' % (ref, float(value)))
+        sheet.append('</row>')
+    sheet.append('</sheetData></worksheet>')
+
+    shared = ['<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+              '<sst xmlns="%s" count="%d" uniqueCount="%d">'
+              % (_MAIN_NS, len(strings), len(strings))]
+    shared.extend('<si><t>%s</t></si>' % escape(x)
+                  for x in sorted(strings, key=strings.get))
+    shared.append('</sst>')
+
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        archive.writestr('xl/worksheets/sheet1.xml', ''.join(sheet))
+        archive.writestr('xl/sharedStrings.xml', ''.join(shared))
+
+
+def make_workbook(filename, nparams=25, width=11):
+    """Write a parameter workbook laid out like the gold standard list
+
+    Each of the const, neg, sep and pos blocks holds ``nparams`` parameters
+    with the code name in column 2 and the value in column 3. Every block
+    includes the parameters :func:`reaction_params` needs.
+
+    :param filename: name of the workbook to write
+    :param nparams: number of parameters per block
+    :param width: number of columns of the sheet
+    :type filename: string
+    :type nparams: integer
+    :type width: integer
+    :return: 1-based rows of each block
+    :rtype: dict"""
+    known = [('csmax', 26390.0), ('k_norm_ref', 2.28e-05), ('alpha', 0.5),
+             ('ce0', 2000.0), ('Tref', 298.15), ('Uocp', UOCP)]
+    rows = [['Cell Information'], ['Parameter', 'Code Name', 'Value', 'Unit']]
+    layout = dict()
+    for block in BLOCKS:
+        rows.extend([[], [block], ['Parameter', 'Code Name', 'Value', 'Unit']])
+        start = len(rows) + 1
+        for ind in range(nparams):
+            (name, value) = known[ind] if ind < len(known) else \
+                ('p%d' % ind, float(ind))
+            rows.append(['Parameter %d' % ind, name, value, '[unitless]'])
+        layout[block] = range(start, len(rows) + 1)
+
+    rows = [row + [None]*(width - len(row)) for row in rows]
+    write_xlsx(filename, rows)
+    return layout
+
+
+def make_csv(filename, nrows, ncols=2):
+    """Write a COMSOL-like numeric csv export
+
+    :param filename: name of the file to write
+    :param nrows: number of data rows
+    :param ncols: number of columns
+    :type filename: string
+    :type nrows: integer
+    :type ncols: integer
+    :return: number of header rows
+    :rtype: integer"""
+    header = ['% Model,synthetic.mph', '% Version,COMSOL 4.4.0.248',
+              '% Date,"Jan 1 2016, 00:00"', '% Dimension,1',
+              '% Nodes,{}'.format(nrows), '% Expressions,1',
+              '% Description,Point graph', '% x,Height']
+    data = np.random.RandomState(0).uniform(size=(nrows, ncols))
+    data[:, 0] = np.arange(nrows)*0.1
+    with open(filename, 'w') as csvfile:
+        csvfile.write('\n'.join(header) + '\n')
+        np.savetxt(csvfile, data, delimiter=',')
+
+    return len(header)
+
+
+def make_mesh(nodes=281):
+    """Build a three-domain mesh with interfaces at 1 and 2
+
+    :param nodes: number of nodes
+    :type nodes: integer
+    :return: node locations
+    :rtype: array"""
+    nneg = max(nodes*NEG_NODES//281, 2)
+    nsep = max(nodes*SEP_NODES//281, 2)
+    npos = max(nodes - nneg - nsep, 2)
+    return np.concatenate((np.linspace(0, 1, nneg),
+                           np.linspace(1, 2, nsep+1)[1:],
+                           np.linspace(2, 3, npos+1)[1:]))
+
+
+def make_comsol(nframes):
+    """Build COMSOL-style variables on the gold standard mesh layout
+
+    :param nframes: number of time steps
+    :type nframes: integer
+    :return: mesh and two-column ce, cse, phie, phis and j exports
+    :rtype: dict"""
+    mesh = make_mesh(281)
+    solid = np.insert(mesh, [NEG_NODES, NEG_NODES+SEP_NODES],
+                      [mesh[NEG_NODES-1], mesh[NEG_NODES+SEP_NODES-1]])
+    random = np.random.RandomState(0)
+    scale = {'ce': (0, 2500), 'cse': (0, 26390), 'phie': (-0.01, 0),
+             'phis': (0.1, 0.2), 'j': (-1e-5, 1e-5)}
+    data = {'mesh': mesh}
+    for (name, (low, high)) in scale.items():
+        x = solid if name in ('cse', 'phis', 'j') else mesh
+        values = random.uniform(low, high, (nframes, len(x)))
+        data[name] = np.column_stack((np.tile(x, nframes), values.ravel()))
+
+    return data
+
+
+def reaction_params():
+    """Electrode and cell parameters for the reaction flux benchmarks
+
+    :return: electrode parameters and cell constants
+    :rtype: tuple of dicts"""
+    from coslib import ldp
+    params = {'csmax': 26390.0, 'k_norm_ref': 2.28e-05, 'alpha': 0.5,
+              'Uocp': ldp._fun_to_lambda(UOCP)}
+    const = {'ce0': 2000.0, 'Tref': 298.15}
+    return (params, const)
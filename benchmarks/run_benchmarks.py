@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""Time the ldp and ttp hot paths on synthetic data of increasing size
+
+:example:
+
+python benchmarks/run_benchmarks.py --sizes small,medium --json out.json
+"""
+import os
+import sys
+import gc
+import json
+import shutil
+import argparse
+import tempfile
+import timeit
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, 'coslib')]
+
+from coslib import ldp  # noqa: E402
+from coslib import ttp  # noqa: E402
+import generators  # noqa: E402
+
+# scale factor of each benchmark size
+SIZES = {'small': 1, 'medium': 10, 'large': 100}
+
+
+def measure(func, repeat=3):
+    """Measure the best wall time and the peak traced memory of a call
+
+    :param func: function to call without arguments
+    :param repeat: number of timed calls
+    :type func: callable
+    :type repeat: integer
+    :return: seconds and peak bytes
+    :rtype: tuple"""
+    func()
+    seconds = min(timeit.repeat(func, number=1, repeat=repeat))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return (seconds, peak)
+
+
+def cases(scale, workdir):
+    """Build the benchmark cases of one size
+
+    :param scale: size factor of the synthetic data
+    :param workdir: directory for generated files
+    :type scale: integer
+    :type workdir: string
+    :return: benchmark names, sizes and functions
+    :rtype: list of tuples"""
+    workbook = os.path.join(workdir, 'params_{}.xlsx'.format(scale))
+    nparams = 25*scale
+    layout = generators.make_workbook(workbook, nparams)
+    sheet = ldp.read_excel(workbook, 0, cache=False)
+
+    csvfile = os.path.join(workdir, 'export_{}.csv'.format(scale))
+    nrows = 10000*scale
+    header = generators.make_csv(csvfile, nrows)
+    sheet_csv = ldp.read_csv(csvfile, header+1, assume=ldp.NUMBER)
+
+    nframes = 50*scale
+    comsol = generators.make_comsol(nframes)
+    frames = ttp.FrameIndex(comsol['ce'])
+    time = list(frames.time)
+    mesh = generators.make_mesh(281*scale)
+    sim = ttp.assemble_comsol(time, comsol)
+    (params, const) = generators.reaction_params()
+
+    def load_params():
+        for rows in layout.values():
+            ldp.load_params(sheet, rows, 2, 3)
+
+    return [
+        ('read_excel', '{} params'.format(4*nparams),
+         lambda: ldp.read_excel(workbook, 0, cache=False)),
+        ('read_excel xlrd', '{} params'.format(4*nparams),
+         lambda: ldp.read_excel(workbook, 0, cache=False, backend='xlrd')),
+        ('read_excel stop', '20 of {} rows'.format(sheet.size()[0]),
+         lambda: ldp.read_excel(workbook, 0, cache=False, stop=20)),
+        ('read_csv', '{} rows'.format(nrows),
+         lambda: ldp.read_csv(csvfile, header+1, assume=ldp.NUMBER)),
+        ('read_csv window', '100 of {} rows'.format(nrows),
+         lambda: ldp.read_csv(csvfile, header+1, header+100,
+                              assume=ldp.NUMBER)),
+        ('load_section', '{} rows'.format(nrows),
+         lambda: ldp.load_section(sheet_csv, range(1, nrows+1), 2)),
+        ('load_params', '{} params'.format(4*nparams), load_params),
+        ('load_blocks', '{} params'.format(4*nparams),
+         lambda: ldp.load_blocks(sheet, layout)),
+        ('get_var', '{} frames'.format(nframes),
+         lambda: ttp.get_var(comsol['ce'], time[-1])),
+        ('assemble_comsol', '{} frames'.format(nframes),
+         lambda: ttp.assemble_comsol(time, comsol)),
+        ('region', '{} nodes'.format(len(mesh)), lambda: ttp.region(mesh)),
+        ('reaction_flux', '{} frames'.format(nframes),
+         lambda: ttp.reaction_flux(sim, params, const)),
+        ('reaction_flux_batch', '{} frames'.format(nframes),
+         lambda: ttp.reaction_flux_batch(sim, params, const)),
+    ]
+
+
+def main(argv=None):
+    """Run the benchmarks and print a summary table"""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='small,medium',
+                        help='comma separated sizes out of {}'.format(
+                            ', '.join(sorted(SIZES, key=SIZES.get))))
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed calls per benchmark')
+    parser.add_argument('--filter', default='',
+                        help='only run benchmarks containing this text')
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args(argv)
+
+    results = []
+    workdir = tempfile.mkdtemp(prefix='coslib-bench-')
+    try:
+        for size in args.sizes.split(','):
+            for (name, problem, func) in cases(SIZES[size], workdir):
+                if args.filter not in name:
+                    continue
+                (seconds, peak) = measure(func, args.repeat)
+                results.append({'benchmark': name, 'size': size,
+                                'problem': problem, 'seconds': seconds,
+                                'peak_bytes': peak})
+                print('{:<22}{:<8}{:<18}{:>12.3f} ms{:>12.2f} MiB'.format(
+                    name, size, problem, seconds*1e3, peak/2.0**20))
+    finally:
+        shutil.rmtree(workdir)
+
+    if args.json:
+        with open(args.json, 'w') as out:
+            json.dump(results, out, indent=2)
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
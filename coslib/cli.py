@@ -1,14 +1,182 @@
 # -*- coding: utf-8 -*-
 
+import os
+import json
+import multiprocessing
+
 import click
+import numpy as np
+
+from coslib import ldp
+from coslib import ttp
+
+
+def _run(job, items, workers):
+    """Apply a job to every item, spreading the items over a process pool
+
+    :param job: module level function to apply
+    :param items: job arguments
+    :param workers: number of processes, 1 to run in this process
+    :type job: callable
+    :type items: list
+    :type workers: integer
+    :return: job results in the order of the items
+    :rtype: iterator"""
+    if workers <= 1 or len(items) <= 1:
+        return (job(x) for x in items)
+
+    pool = multiprocessing.Pool(min(workers, len(items)))
+    try:
+        return iter(pool.map(job, items))
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _load_layout(layout):
+    """Read a parameter block layout
+
+    :param layout: JSON file mapping block names to the first and last row
+    :type layout: string or None
+    :return: rows of each block
+    :rtype: dict"""
+    if layout is None:
+        return ttp.PARAMETER_LAYOUT
+
+    with open(layout) as layout_file:
+        return dict((block, range(first, last+1)) for (block, (first, last))
+                    in json.load(layout_file).items())
+
+
+def _load_comsol(path):
+    """Open a COMSOL dataset directory or .npz archive"""
+    if os.path.isdir(path):
+        return ldp.load_dataset(path)
+    return ldp.load(path)
+
+
+def _convert_job(args):
+    """Convert one COMSOL export to a dataset"""
+    (source, output) = args
+    if os.path.isdir(source):
+        data = dict(
+            (os.path.splitext(x)[0], ldp.loadtxt(
+                os.path.join(source, x), comments='%', delimiter=','))
+            for x in sorted(os.listdir(source)) if x.endswith('.csv'))
+    else:
+        data = ldp.load(source)
+
+    ldp.save_dataset(output, data)
+    return (source, output, len(data))
+
+
+def _params_job(args):
+    """Load the parameter blocks of one workbook into its bundle"""
+    (workbook, layout, sheet) = args
+    params = ldp.load_param_bundle(workbook, layout, sheet)
+    return (workbook, dict((block, len(x)) for (block, x) in params.items()))
+
+
+def _flux_job(args):
+    """Compute and validate the reaction flux of one COMSOL dataset"""
+    (path, params, time, output) = args
+    comsol = _load_comsol(path)
+    if not time:
+        time = list(ttp.FrameIndex.from_data(comsol, 'j').time)
+
+    data = ttp.assemble_comsol(time, comsol)
+    mesh = ttp.region(comsol['mesh'])
+    flux = ttp.electrode_flux(data, mesh, params)
+    if output:
+        stem = os.path.splitext(os.path.basename(path.rstrip(os.sep)))[0]
+        for (name, value) in flux.items():
+            np.save(os.path.join(output, '{}_j{}.npy'.format(stem, name)),
+                    value)
+
+    return (path, ttp.validate_flux(data, mesh, params, time, flux=flux))
+
+
+@click.group()
+def main():
+    """Convert COMSOL exports, load cell parameters and validate reaction
+    flux."""
+
+
+@main.command()
+@click.argument('exports', nargs=-1, required=True,
+                type=click.Path(exists=True))
+@click.option('-o', '--output', default='.', type=click.Path(),
+              help='Directory to write the datasets to.')
+@click.option('-j', '--workers', default=1, show_default=True,
+              help='Number of worker processes.')
+def convert(exports, output, workers):
+    """Convert COMSOL exports to memory-mapped datasets.
+
+    Each export is a .npz archive or a directory of csv files, one per
+    variable."""
+    jobs = [(x, os.path.join(output, os.path.splitext(
+        os.path.basename(x.rstrip(os.sep)))[0])) for x in exports]
+    for (source, dataset, count) in _run(_convert_job, jobs, workers):
+        click.echo('{} -> {} ({} arrays)'.format(source, dataset, count))
+
+
+@main.command()
+@click.argument('workbooks', nargs=-1, required=True,
+                type=click.Path(exists=True, dir_okay=False))
+@click.option('--layout', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file mapping block names to [first, last] rows.')
+@click.option('--sheet', default=0, show_default=True,
+              help='Index of the parameter sheet.')
+@click.option('-j', '--workers', default=1, show_default=True,
+              help='Number of worker processes.')
+def params(workbooks, layout, sheet, workers):
+    """Load parameter workbooks into the parameter bundle cache."""
+    layout = _load_layout(layout)
+    jobs = [(x, layout, sheet) for x in workbooks]
+    for (workbook, counts) in _run(_params_job, jobs, workers):
+        click.echo('{}: {}'.format(workbook, ', '.join(
+            '{} {}'.format(block, counts[block]) for block in sorted(counts))))
+
+
+@main.command()
+@click.argument('datasets', nargs=-1, required=True,
+                type=click.Path(exists=True))
+@click.option('-p', '--params', 'workbook', required=True,
+              type=click.Path(exists=True, dir_okay=False),
+              help='Parameter workbook of the cell.')
+@click.option('--layout', type=click.Path(exists=True, dir_okay=False),
+              help='JSON file mapping block names to [first, last] rows.')
+@click.option('--sheet', default=0, show_default=True,
+              help='Index of the parameter sheet.')
+@click.option('-t', '--time', multiple=True, type=float,
+              help='Time to evaluate, may be repeated. Defaults to all.')
+@click.option('-o', '--output', type=click.Path(file_okay=False),
+              help='Directory to save the computed flux to.')
+@click.option('--json', 'report', type=click.Path(dir_okay=False),
+              help='File to write the errors of every time step to.')
+@click.option('-j', '--workers', default=1, show_default=True,
+              help='Number of worker processes.')
+def flux(datasets, workbook, layout, sheet, time, output, report, workers):
+    """Compute reaction flux and validate it against COMSOL data."""
+    cell_params = ldp.load_param_bundle(workbook, _load_layout(layout), sheet)
+    if output and not os.path.isdir(output):
+        os.makedirs(output)
 
+    jobs = [(x, cell_params, list(time), output) for x in datasets]
+    records = []
+    for (path, errors) in _run(_flux_job, jobs, workers):
+        for name in sorted(set(errors['domain'])):
+            rows = errors[errors['domain'] == name]
+            click.echo('{} {} rms: max {:.6e}, mean {:.6e}, max abs {:.6e}'
+                       .format(path, name, np.max(rows['rms']),
+                               np.mean(rows['rms']), np.max(rows['max_abs'])))
+        for record in ttp.validation_records(errors):
+            record['dataset'] = path
+            records.append(record)
 
-@click.command()
-def main(args=None):
-    """Console script for coslib"""
-    click.echo("Replace this message by putting your code into "
-               "coslib.cli.main")
-    click.echo("See click documentation at http://click.pocoo.org/")
+    if report:
+        with open(report, 'w') as report_file:
+            json.dump(records, report_file, indent=2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,241 @@
+"""Execution settings of the numexpr-backed ldp and ttp evaluation
+
+Parameter expressions and flux kernels run on numexpr's own thread pool,
+and sharded work such as the flux of each electrode runs on a pool of
+threads or processes. Running several coslib jobs on one node multiplies
+these, so both are set here: for the whole run through the
+``COSLIB_NUM_THREADS``, ``COSLIB_EXECUTOR`` and ``COSLIB_WORKERS``
+environment variables, or for a block of code with :func:`configure`.
+
+:example:
+
+with execution.configure(num_threads=1, executor='process', workers=4):
+    flux = ttp.electrode_flux(data, mesh, params)
+
+Each worker runs numexpr on ``num_threads`` threads, one if not set, so
+``workers`` shards never start more than ``workers*num_threads`` threads.
+The pool of a configuration is started on its first use and kept until the
+:func:`configure` block exits, or until the end of the run for the
+environment settings.
+"""
+import os
+import atexit
+import threading
+import contextlib
+import multiprocessing
+from multiprocessing.pool import ThreadPool
+
+# environment variables of the default settings
+NUM_THREADS_ENV = 'COSLIB_NUM_THREADS'
+EXECUTOR_ENV = 'COSLIB_EXECUTOR'
+WORKERS_ENV = 'COSLIB_WORKERS'
+
+# ways of running sharded work
+EXECUTORS = ('serial', 'thread', 'process')
+
+# fewest array elements worth handing to a pool, smaller jobs run in the
+# calling thread
+MIN_POOL_ELEMENTS = 1 << 16
+
+# numexpr thread counts are process wide, changes must not interleave
+_LOCK = threading.RLock()
+
+
+class Config(object):
+    """Execution settings
+
+    :param num_threads: numexpr threads, numexpr's own default if None
+    :param executor: one of :data:`EXECUTORS`
+    :param workers: number of shards run at once, the number of CPUs if None
+    :type num_threads: integer or None
+    :type executor: string
+    :type workers: integer or None"""
+
+    __slots__ = ('num_threads', 'executor', 'workers', '_pool')
+
+    def __init__(self, num_threads=None, executor='serial', workers=None):
+        if executor not in EXECUTORS:
+            raise ValueError('Unknown executor {!r}, expected one of '
+                             '{}'.format(executor, ', '.join(EXECUTORS)))
+        for value in (num_threads, workers):
+            if value is not None and value < 1:
+                raise ValueError('Thread and worker counts must be positive')
+        self.num_threads = num_threads
+        self.executor = executor
+        self.workers = workers
+        self._pool = (None, None)
+
+    @classmethod
+    def from_environ(cls, environ=None):
+        """Read the settings from the environment
+
+        :param environ: environment variables, defaults to :data:`os.environ`
+        :type environ: dict or None
+        :return: settings
+        :rtype: :class:`Config`"""
+        environ = os.environ if environ is None else environ
+
+        def count(name):
+            value = environ.get(name, '')
+            return int(value) if value else None
+
+        return cls(count(NUM_THREADS_ENV),
+                   environ.get(EXECUTOR_ENV, '') or 'serial',
+                   count(WORKERS_ENV))
+
+    def pool_size(self, jobs):
+        """Number of workers running the given number of jobs
+
+        :param jobs: number of jobs
+        :type jobs: integer
+        :return: pool size, 1 to run the jobs in this thread
+        :rtype: integer"""
+        if self.executor == 'serial':
+            return 1
+        return max(min(self.workers or multiprocessing.cpu_count(), jobs), 1)
+
+    def pool(self):
+        """Pool running the shards of these settings, started on first use
+
+        Process pools are replaced by thread pools within pool workers,
+        which cannot start processes of their own.
+
+        :return: thread or process pool of ``workers``
+        :rtype: :class:`multiprocessing.pool.Pool`"""
+        with _LOCK:
+            (owner, pool) = self._pool
+            # a forked process cannot use the pool of its parent
+            if pool is None or owner != os.getpid():
+                size = self.workers or multiprocessing.cpu_count()
+                if self.executor == 'process' and \
+                        not multiprocessing.current_process().daemon:
+                    pool = multiprocessing.Pool(
+                        size, _init_worker, (self.num_threads or 1,))
+                else:
+                    pool = ThreadPool(size)
+                self._pool = (os.getpid(), pool)
+            return pool
+
+    def close(self):
+        """Stop the pool of these settings, if this process started one"""
+        with _LOCK:
+            (owner, pool) = self._pool
+            self._pool = (None, None)
+        if pool is not None and owner == os.getpid():
+            pool.close()
+            pool.join()
+
+    def __repr__(self):
+        return 'Config(num_threads={}, executor={!r}, workers={})'.format(
+            self.num_threads, self.executor, self.workers)
+
+
+# settings of the current run
+config = Config.from_environ()
+
+
+def set_num_threads(num_threads):
+    """Set the size of numexpr's thread pool
+
+    :param num_threads: number of threads, left unchanged if None
+    :type num_threads: integer or None
+    :return: previous number of threads
+    :rtype: integer"""
+    import numexpr as ne
+    if num_threads is None:
+        return ne.get_num_threads()
+    return ne.set_num_threads(num_threads)
+
+
+@contextlib.contextmanager
+def configure(num_threads=None, executor=None, workers=None):
+    """Change the execution settings within a block
+
+    Settings that are not given keep their current value, and the settings
+    and numexpr thread count are restored when the block exits, which also
+    stops the pool of the block.
+
+    :param num_threads: numexpr threads
+    :param executor: one of :data:`EXECUTORS`
+    :param workers: number of shards run at once
+    :type num_threads: integer or None
+    :type executor: string or None
+    :type workers: integer or None
+    :return: settings of the block
+    :rtype: :class:`Config`"""
+    global config
+    previous = config
+    settings = Config(
+        previous.num_threads if num_threads is None else num_threads,
+        previous.executor if executor is None else executor,
+        previous.workers if workers is None else workers)
+    with _LOCK:
+        threads = set_num_threads(settings.num_threads)
+        config = settings
+    try:
+        yield settings
+    finally:
+        with _LOCK:
+            config = previous
+            set_num_threads(threads)
+        settings.close()
+
+
+def _init_worker(num_threads):
+    """Size the numexpr thread pool of a worker process"""
+    set_num_threads(num_threads)
+
+
+def pool_map(func, items, elements=None):
+    """Apply a function to every item as set by :data:`config`
+
+    Items run one after the other in this thread with the ``serial``
+    executor, or if they hold fewer than :data:`MIN_POOL_ELEMENTS` array
+    elements in all, otherwise on the pool of :meth:`Config.pool`. Process
+    pools need a module level function and picklable items.
+
+    :param func: function of one item
+    :param items: function arguments
+    :param elements: number of array elements of all the items, if known
+    :type func: callable
+    :type items: list
+    :type elements: integer or None
+    :return: results in the order of the items
+    :rtype: list"""
+    settings = config
+    if settings.pool_size(len(items)) <= 1 or (
+            elements is not None and elements < MIN_POOL_ELEMENTS):
+        return [func(x) for x in items]
+
+    pool = settings.pool()
+    if not isinstance(pool, ThreadPool):
+        return pool.map(func, items)
+
+    with _LOCK:
+        threads = set_num_threads(settings.num_threads or 1)
+    try:
+        return pool.map(func, items)
+    finally:
+        with _LOCK:
+            set_num_threads(threads)
+
+
+def shards(length, count):
+    """Split a range into contiguous slices of nearly equal length
+
+    :param length: length of the range
+    :param count: number of slices
+    :type length: integer
+    :type count: integer
+    :return: at most ``count`` non-empty slices
+    :rtype: list of slices"""
+    count = max(min(count, length), 1)
+    edges = [length*k//count for k in range(count + 1)]
+    return [slice(start, stop) for (start, stop) in zip(edges, edges[1:])]
+
+
+if config.num_threads is not None:
+    set_num_threads(config.num_threads)
+
+# the pool of the environment settings lasts until the end of the run
+atexit.register(lambda: config.close())
@@ -0,0 +1,266 @@
+"""Opt-in instrumentation of the ldp and ttp hot paths
+
+Instrumentation is off by default. It is turned on for the whole run by
+setting the ``COSLIB_PROFILE`` environment variable, or for a block of code
+with :func:`profile`. While it is on, each call to an :func:`instrumented`
+function records its wall time, the peak bytes it allocated and the number
+of array elements it was passed and returned.
+
+:example:
+
+with instrument.profile() as stats:
+    data = ttp.assemble_comsol(time, comsol)
+    ttp.reaction_flux(data, params, const)
+print(stats.table())
+
+Setting ``COSLIB_PROFILE=1`` prints the summary table to stderr at exit, and
+``COSLIB_PROFILE=profile.json`` also writes the statistics to that file.
+"""
+import os
+import sys
+import json
+import time
+import atexit
+import functools
+import threading
+import contextlib
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+# environment variable that turns instrumentation on for the whole run
+PROFILE_ENV = 'COSLIB_PROFILE'
+
+_FIELDS = ('calls', 'seconds', 'bytes', 'max_bytes', 'elements')
+
+
+class Stats(object):
+    """Call statistics of the instrumented functions
+
+    Allocations are measured with :mod:`tracemalloc`, which traces the
+    whole process, so calls running concurrently in other threads add to
+    each other's byte counts."""
+
+    def __init__(self):
+        self.enabled = False
+        self.records = dict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def record(self, name, seconds, allocated, elements):
+        """Add one call to the statistics of a function
+
+        :param name: name of the function
+        :param seconds: wall time of the call
+        :param allocated: peak bytes allocated during the call
+        :param elements: number of array elements passed and returned
+        :type name: string
+        :type seconds: float
+        :type allocated: integer
+        :type elements: integer"""
+        with self._lock:
+            entry = self.records.setdefault(name, dict.fromkeys(_FIELDS, 0))
+            entry['calls'] += 1
+            entry['seconds'] += seconds
+            entry['bytes'] += allocated
+            entry['max_bytes'] = max(entry['max_bytes'], allocated)
+            entry['elements'] += elements
+
+    def reset(self):
+        """Clear the recorded statistics"""
+        with self._lock:
+            self.records.clear()
+
+    def summary(self):
+        """Copy of the recorded statistics
+
+        :return: calls, seconds, bytes, max_bytes and elements of each
+            function
+        :rtype: dict"""
+        with self._lock:
+            return dict((name, dict(entry))
+                        for (name, entry) in self.records.items())
+
+    def to_json(self, filename=None):
+        """Export the statistics as JSON
+
+        :param filename: file to write to, if any
+        :type filename: string or None
+        :return: statistics as a JSON document
+        :rtype: string"""
+        text = json.dumps(self.summary(), indent=2, sort_keys=True)
+        if filename is not None:
+            with open(filename, 'w') as out:
+                out.write(text)
+        return text
+
+    def table(self):
+        """Format the statistics as a table sorted by total time
+
+        :return: one line per function
+        :rtype: string"""
+        lines = ['{:<34}{:>8}{:>12}{:>12}{:>12}{:>14}'.format(
+            'function', 'calls', 'total ms', 'mean ms', 'peak MiB',
+            'elements')]
+        summary = self.summary()
+        for name in sorted(summary, key=lambda x: -summary[x]['seconds']):
+            entry = summary[name]
+            lines.append('{:<34}{:>8}{:>12.3f}{:>12.3f}{:>12.2f}{:>14}'.format(
+                name, entry['calls'], entry['seconds']*1e3,
+                entry['seconds']*1e3/entry['calls'],
+                entry['max_bytes']/2.0**20, entry['elements']))
+        return '\n'.join(lines)
+
+    def _enter(self):
+        """Start measuring the allocations of a call"""
+        if tracemalloc is None or not tracemalloc.is_tracing():
+            return 0
+
+        stack = self._stack()
+        (current, peak) = tracemalloc.get_traced_memory()
+        if hasattr(tracemalloc, 'reset_peak'):
+            # keep the peak of the calling function before measuring afresh
+            if stack:
+                stack[-1] = max(stack[-1], peak)
+            tracemalloc.reset_peak()
+        stack.append(0)
+        return current
+
+    def _exit(self, start):
+        """Stop measuring the allocations of a call
+
+        :return: peak bytes allocated since :meth:`_enter`
+        :rtype: integer"""
+        if tracemalloc is None or not tracemalloc.is_tracing():
+            return 0
+
+        stack = self._stack()
+        peak = max(tracemalloc.get_traced_memory()[1],
+                   stack.pop() if stack else 0)
+        if stack:
+            stack[-1] = max(stack[-1], peak)
+        return max(peak - start, 0)
+
+    def _stack(self):
+        """Peak memory of the instrumented calls running in this thread"""
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+
+# statistics of the current run
+stats = Stats()
+
+
+def _elements(value):
+    """Number of array elements held by a value"""
+    # sparse spreadsheets build their dense arrays on use, only count cells
+    if hasattr(value, 'block'):
+        value = value.block
+    elif hasattr(value, 'cell_numbers'):
+        value = value.cell_numbers
+    elif hasattr(value, 'numbers'):
+        value = value.numbers
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, (list, tuple)):
+        return sum(getattr(x, 'size', 0) for x in value)
+    size = getattr(value, 'size', 0)
+    return size if isinstance(size, int) else 0
+
+
+def instrumented(func):
+    """Record the calls to a function while instrumentation is enabled
+
+    The check for whether instrumentation is enabled is the only cost added
+    to calls while it is off.
+
+    :param func: function to instrument
+    :type func: callable
+    :return: wrapped function
+    :rtype: callable"""
+    name = '{}.{}'.format(func.__module__.split('.')[-1],
+                          getattr(func, '__qualname__', func.__name__))
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not stats.enabled:
+            return func(*args, **kwargs)
+
+        start = stats._enter()
+        clock = time.time()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            seconds = time.time() - clock
+            allocated = stats._exit(start)
+        elements = sum(_elements(x) for x in args) + sum(
+            _elements(x) for x in kwargs.values()) + _elements(result)
+        stats.record(name, seconds, allocated, elements)
+        return result
+
+    return wrapper
+
+
+def enable(memory=True):
+    """Turn instrumentation on
+
+    :param memory: trace allocations with :mod:`tracemalloc`
+    :type memory: bool
+    :return: whether this call started tracing allocations
+    :rtype: bool"""
+    stats.enabled = True
+    if memory and tracemalloc is not None and not tracemalloc.is_tracing():
+        tracemalloc.start()
+        return True
+    return False
+
+
+def disable(stop_tracing=True):
+    """Turn instrumentation off
+
+    :param stop_tracing: also stop tracing allocations
+    :type stop_tracing: bool"""
+    stats.enabled = False
+    if stop_tracing and tracemalloc is not None and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+@contextlib.contextmanager
+def profile(memory=True, reset=True):
+    """Instrument the calls made within a block
+
+    :param memory: trace allocations with :mod:`tracemalloc`
+    :param reset: clear the statistics of earlier calls
+    :type memory: bool
+    :type reset: bool
+    :return: statistics of the block
+    :rtype: Stats"""
+    if reset:
+        stats.reset()
+    enabled = stats.enabled
+    started = enable(memory)
+    try:
+        yield stats
+    finally:
+        if not enabled:
+            disable(started)
+        elif started:
+            tracemalloc.stop()
+
+
+def _report():
+    """Print the statistics of a run profiled through the environment"""
+    if not stats.records:
+        return
+    sys.stderr.write(stats.table() + '\n')
+    target = os.environ.get(PROFILE_ENV, '')
+    if target.endswith('.json'):
+        stats.to_json(target)
+
+
+if os.environ.get(PROFILE_ENV, '0') not in ('', '0'):
+    enable()
+    atexit.register(_report)
@@ -1,24 +1,60 @@
 """Required modules"""
+import os
 import re
 import csv
 import sys
+import json
+import zipfile
+import hashlib
+import tempfile
+import itertools
+import threading
+import collections
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 import numpy as np
-import scipy.io as sio
-import xlrd
-import numexpr as ne
 
-DATE = xlrd.XL_CELL_DATE
-TEXT = xlrd.XL_CELL_TEXT
-BLANK = xlrd.XL_CELL_BLANK
-EMPTY = xlrd.XL_CELL_EMPTY
-ERROR = xlrd.XL_CELL_ERROR
-NUMBER = xlrd.XL_CELL_NUMBER
-
-
-def read_excel(filename, sheet=None):
+# execution applies the COSLIB_NUM_THREADS numexpr thread count on import
+try:
+    from coslib import execution  # noqa: F401
+    from coslib import instrument
+except ImportError:
+    import execution  # noqa: F401
+    import instrument
+
+# xlrd cell types, defined here so that xlrd is only imported when reading
+# a workbook
+EMPTY = 0  # xlrd.XL_CELL_EMPTY
+TEXT = 1  # xlrd.XL_CELL_TEXT
+NUMBER = 2  # xlrd.XL_CELL_NUMBER
+DATE = 3  # xlrd.XL_CELL_DATE
+BOOLEAN = 4  # xlrd.XL_CELL_BOOLEAN
+ERROR = 5  # xlrd.XL_CELL_ERROR
+BLANK = 6  # xlrd.XL_CELL_BLANK
+
+# cell types whose values are held in :attr:`Spreadsheet.numbers`
+_NUMERIC = (NUMBER, DATE, BOOLEAN, ERROR)
+
+# largest fraction of populated cells for which read_excel keeps a sheet
+# sparse, about where coordinate storage stops saving memory
+SPARSE_DENSITY = 0.5
+
+# metadata file of a dataset and the suffix of its frame offset entries
+DATASET_METADATA = 'metadata.npz'
+_FRAMES = '.frames'
+
+
+@instrument.instrumented
+def read_excel(filename, sheet=None, cache=True, sparse=None, backend=None,
+               stop=None):
     """Read sheet data or sheet names from an Excel workbook into a
     :class:`Spreadsheet`.
 
+    ``.xlsx`` workbooks are streamed row by row with :class:`XlsxReader` by
+    default, other workbooks are read with xlrd. Both are kept in
+    :data:`workbook_cache`, so that repeated reads from the same file do not
+    parse it again, and sheets are only loaded when requested.
+
     :example:
 
     sheet_names = read_excel('parameter.xlsx') # returns a list of sheet names
@@ -33,23 +69,606 @@ def read_excel(filename, sheet=None):
 
     :param filename: name of the excel woorkbook to import
     :param sheet: spreadsheet name or index to import
+    :param cache: use the workbook cache
+    :param sparse: store only populated cells, chosen by the density of the
+        sheet if None
+    :param backend: 'xlsx' to stream the workbook or 'xlrd', chosen by the
+        file type if None
+    :param stop: last row to read, counting from 1
     :type filename: string
     :type sheet: string or integer or None
+    :type cache: bool
+    :type sparse: bool or None
+    :type backend: string or None
+    :type stop: integer or None
     :return: sheet names if sheet is None, otherwise sheet data
-    :rtype: list of strings if sheet is None, otherwise :class:`Spreadsheet`"""
+    :rtype: list of strings if sheet is None, otherwise :class:`Spreadsheet`
+        or :class:`SparseSpreadsheet`"""
 
-    book = xlrd.open_workbook(filename)
-    spreadsheet = Spreadsheet()
     if sheet is None:
-        return book.sheet_names()
-    elif isinstance(sheet, int):
+        if cache:
+            return workbook_cache.sheet_names(filename)
+        return _sheet_names(filename)
+
+    backend = _backend(filename, backend)
+    if backend == 'xlsx' and not cache:
+        with XlsxReader(filename) as reader:
+            return _fill_sheet(reader.rows(sheet, stop), sparse)
+
+    if backend == 'xlsx':
+        return _storage(
+            workbook_cache.open(filename, backend).sheet(sheet, stop), sparse)
+
+    book = workbook_cache.open(filename, backend) if cache else \
+        _open_workbook(filename)
+    return _read_sheet(book, sheet, sparse, stop)
+
+
+@instrument.instrumented
+def read_sheets(requests, workers=None, processes=False):
+    """Read many sheets from many Excel workbooks concurrently
+
+    Requests are grouped by workbook so that each workbook is opened only
+    once, and the workbooks are parsed on a thread pool, or on a process pool
+    if ``processes`` is set.
+
+    :example:
+
+    sheets = read_sheets([('cell_a.xlsx', 0), ('cell_b.xlsx', 'Parameters'),
+                          ('cell_b.xlsx', 'OCV')], workers=4)
+
+    :param requests: workbook names and sheet names or indices
+    :param workers: size of the pool, defaults to the number of CPUs
+    :param processes: parse on a process pool instead of threads
+    :type requests: iterable of tuples
+    :type workers: integer or None
+    :type processes: bool
+    :return: mapping of the requests to their sheet data
+    :rtype: dict of :class:`Spreadsheet`"""
+    groups = collections.OrderedDict()
+    for (filename, sheet) in requests:
+        sheets = groups.setdefault(filename, [])
+        if sheet not in sheets:
+            sheets.append(sheet)
+
+    # worker processes do not share the workbook cache, keep it to threads
+    jobs = [(filename, sheets, not processes)
+            for (filename, sheets) in groups.items()]
+    if workers == 1 or len(jobs) <= 1:
+        results = [_read_workbook_sheets(x) for x in jobs]
+    else:
+        pool = (multiprocessing.Pool if processes else ThreadPool)(
+            min(workers or multiprocessing.cpu_count(), len(jobs)))
+        try:
+            results = pool.map(_read_workbook_sheets, jobs)
+        finally:
+            pool.close()
+            pool.join()
+
+    return dict(((filename, sheet), spreadsheet)
+                for ((filename, sheets, _), spreadsheets) in zip(jobs, results)
+                for (sheet, spreadsheet) in zip(sheets, spreadsheets))
+
+
+def _read_workbook_sheets(job):
+    """Read several sheets of one workbook
+
+    :param job: workbook name, sheet names or indices and whether to use the
+        workbook cache
+    :type job: tuple
+    :return: sheet data in the order of the requested sheets
+    :rtype: list of :class:`Spreadsheet`"""
+    (filename, sheets, cache) = job
+    if _backend(filename) == 'xlsx' and cache:
+        book = workbook_cache.open(filename)
+        return [_storage(book.sheet(sheet)) for sheet in sheets]
+    if _backend(filename) == 'xlsx':
+        with XlsxReader(filename) as reader:
+            return [_fill_sheet(reader.rows(sheet)) for sheet in sheets]
+
+    book = workbook_cache.open(filename) if cache else _open_workbook(filename)
+    try:
+        return [_read_sheet(book, sheet) for sheet in sheets]
+    finally:
+        if not cache:
+            book.release_resources()
+
+
+def _backend(filename, backend=None):
+    """Choose the reader of a workbook, streaming xlsx workbooks by default
+
+    :return: 'xlsx' or 'xlrd'
+    :rtype: string"""
+    if backend is None:
+        return 'xlsx' if os.path.splitext(filename)[1].lower() in \
+            ('.xlsx', '.xlsm') and zipfile.is_zipfile(filename) else 'xlrd'
+    if backend not in ('xlsx', 'xlrd'):
+        raise ValueError('unknown backend: {}'.format(backend))
+    return backend
+
+
+def _read_sheet(book, sheet, sparse=None, stop=None):
+    """Read a sheet of an open xlrd workbook into a :class:`Spreadsheet`"""
+    if isinstance(sheet, int):
         xl_sheet = book.sheet_by_index(sheet)
-        spreadsheet.set_data(xl_sheet.get_rows())
-        return spreadsheet
     else:
         xl_sheet = book.sheet_by_name(sheet)
-        spreadsheet.set_data(xl_sheet.get_rows())
-        return spreadsheet
+
+    return _fill_sheet(itertools.islice(xl_sheet.get_rows(), stop), sparse)
+
+
+def _fill_sheet(rows, sparse=None):
+    """Store rows of cells in a :class:`Spreadsheet`
+
+    Only the populated cells are read. The sheet is kept sparse if ``sparse``
+    is True, or if it is None and at most :data:`SPARSE_DENSITY` of the
+    cells are populated."""
+    spreadsheet = Spreadsheet() if sparse is False else SparseSpreadsheet()
+    spreadsheet.set_data(rows)
+    return spreadsheet if sparse is False else _storage(spreadsheet, sparse)
+
+
+def _storage(spreadsheet, sparse=None):
+    """Convert a :class:`SparseSpreadsheet` to dense storage unless ``sparse``
+    is True, or it is None and at most :data:`SPARSE_DENSITY` of the cells
+    are populated"""
+    if sparse is False or (
+            sparse is None and spreadsheet.density() > SPARSE_DENSITY):
+        return spreadsheet.dense()
+    return spreadsheet
+
+
+def _open_workbook(filename):
+    """Open an Excel workbook, deferring sheet loading where possible"""
+    import xlrd
+    return xlrd.open_workbook(filename, on_demand=True)
+
+
+def _sheet_names(filename):
+    """Read the sheet names of an Excel workbook without loading its sheets
+
+    :param filename: name of the excel workbook
+    :type filename: string
+    :return: sheet names
+    :rtype: list of strings"""
+    if not zipfile.is_zipfile(filename):
+        book = _open_workbook(filename)
+        names = book.sheet_names()
+        book.release_resources()
+        return names
+
+    # xlrd parses every sheet of an xlsx workbook when opening it, the names
+    # are read from the workbook part directly instead
+    with XlsxReader(filename) as reader:
+        return reader.sheet_names()
+
+
+class _StreamedBook(object):
+    """Sheets of a streamed xlsx workbook, parsed on first use
+
+    Stands in for an xlrd workbook in :class:`WorkbookCache`. Each sheet is
+    kept as one :class:`SparseSpreadsheet` covering the most rows read from
+    it so far, and reads that stop earlier are selected from it."""
+
+    def __init__(self, filename):
+        """Entry point for :class:`_StreamedBook`
+
+        :param filename: name of the xlsx workbook
+        :type filename: string"""
+        self.filename = filename
+        self._names = None
+        self._sheets = dict()
+
+    def sheet_names(self):
+        """Retrieve the sheet names of the workbook"""
+        if self._names is None:
+            with XlsxReader(self.filename) as reader:
+                self._names = reader.sheet_names()
+        return self._names
+
+    def sheet(self, sheet, stop=None):
+        """Read a sheet, see :func:`read_excel`
+
+        :param sheet: sheet name or index
+        :param stop: last row to read, counting from 1
+        :type sheet: string or integer
+        :type stop: integer or None
+        :return: copy of the cached sheet data
+        :rtype: :class:`SparseSpreadsheet`"""
+        if isinstance(sheet, int):
+            sheet = self.sheet_names()[sheet]
+
+        (read, cached) = self._sheets.get(sheet, (None, None))
+        if cached is None or (read is not None and (
+                stop is None or stop > read)):
+            with XlsxReader(self.filename) as reader:
+                cached = _fill_sheet(reader.rows(sheet, stop), True)
+            self._sheets[sheet] = (stop, cached)
+
+        keep = slice(None) if stop is None else cached.row < max(stop, 0)
+        copy = SparseSpreadsheet(cached.assume)
+        row = cached.row[keep]
+        col = cached.col[keep]
+        # streamed rows end at their last populated cell, so the cells give
+        # the size of a read that stops early
+        copy.shape = cached.shape if stop is None else (
+            int(row.max()) + 1 if len(row) else 0,
+            int(col.max()) + 1 if len(col) else 0)
+        (copy.row, copy.col) = (row.copy(), col.copy())
+        copy.cell_ctypes = cached.cell_ctypes[keep].copy()
+        copy.cell_numbers = cached.cell_numbers[keep].copy()
+        copy.cell_text = cached.cell_text[keep].copy()
+        copy.strings = list(cached.strings)
+        return copy
+
+    def release_resources(self):
+        """Forget the parsed sheets"""
+        self._sheets.clear()
+
+
+class WorkbookCache(object):
+    """Least-recently-used cache of open Excel workbooks
+
+    Workbooks are keyed by their absolute path, modification time and
+    backend, so a workbook that changes on disk is opened again on its next
+    use. Streamed xlsx workbooks keep the rows of the sheets read from them,
+    see :func:`read_excel`."""
+
+    def __init__(self, maxsize=8):
+        """Entry point for :class:`WorkbookCache`
+
+        :param maxsize: maximum number of workbooks to keep open
+        :type maxsize: integer"""
+        self.maxsize = maxsize
+        self._books = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(filename, backend='xlrd'):
+        """Build the cache key of a workbook"""
+        path = os.path.abspath(filename)
+        return (path, os.path.getmtime(path), backend)
+
+    def _get(self, key):
+        """Fetch a workbook and mark it as recently used"""
+        with self._lock:
+            book = self._books.pop(key, None)
+            if book is not None:
+                self._books[key] = book
+            return book
+
+    def _insert(self, key, book):
+        """Add a workbook, evicting stale and least recently used ones"""
+        released = []
+        with self._lock:
+            if key in self._books:
+                released.append(book)
+                book = self._books[key]
+            else:
+                self._books[key] = book
+
+            for stale in [x for x in self._books
+                          if x[0] == key[0] and x[1] != key[1]]:
+                released.append(self._books.pop(stale))
+
+            while len(self._books) > max(self.maxsize, 0):
+                released.append(self._books.popitem(last=False)[1])
+
+        for old_book in released:
+            if old_book is not book:
+                old_book.release_resources()
+
+        return book
+
+    def open(self, filename, backend=None):
+        """Open a workbook, reusing a cached handle if available
+
+        :param filename: name of the excel workbook
+        :param backend: 'xlsx' or 'xlrd', chosen by the file type if None
+        :type filename: string
+        :type backend: string or None
+        :return: workbook
+        :rtype: :class:`xlrd.Book` or streamed xlsx workbook"""
+        backend = _backend(filename, backend)
+        key = self._key(filename, backend)
+        book = self._get(key)
+        if book is None:
+            book = self._insert(key, _StreamedBook(filename)
+                                if backend == 'xlsx' else
+                                _open_workbook(filename))
+
+        return book
+
+    def sheet_names(self, filename):
+        """Retrieve the sheet names of a workbook
+
+        :param filename: name of the excel workbook
+        :type filename: string
+        :return: sheet names
+        :rtype: list of strings"""
+        if _backend(filename) == 'xlsx':
+            return self.open(filename, 'xlsx').sheet_names()
+
+        book = self._get(self._key(filename))
+        if book is not None:
+            return book.sheet_names()
+
+        return _sheet_names(filename)
+
+    def clear(self):
+        """Close and forget all cached workbooks"""
+        with self._lock:
+            books = list(self._books.values())
+            self._books.clear()
+
+        for book in books:
+            book.release_resources()
+
+    def __len__(self):
+        return len(self._books)
+
+
+# process-wide workbook cache used by :func:`read_excel`
+workbook_cache = WorkbookCache()
+
+
+# cell of a streamed xlsx sheet
+XlsxCell = collections.namedtuple('XlsxCell', ('ctype', 'value'))
+
+_EMPTY_CELL = XlsxCell(EMPTY, '')
+
+# xlrd codes of the xlsx error values
+_XLSX_ERRORS = {'#NULL!': 0x00, '#DIV/0!': 0x07, '#VALUE!': 0x0F,
+                '#REF!': 0x17, '#NAME?': 0x1D, '#NUM!': 0x24, '#N/A': 0x2A}
+
+# built-in number formats of dates and times
+_XLSX_DATE_FORMATS = frozenset(itertools.chain(
+    range(14, 23), range(27, 37), range(45, 48), range(50, 59)))
+
+_XLSX_LITERALS = re.compile(r'"[^"]*"|\\.|\[[^\]]*\]|_.|\*.')
+
+# 0-based columns keyed by their letters
+_XLSX_COLUMNS = dict()
+
+
+class XlsxReader(object):
+    """Stream the sheets of an xlsx workbook without xlrd
+
+    Sheets are parsed incrementally from the zip archive and their rows are
+    produced lazily, so reading can stop at any row. The shared strings are
+    parsed only as far as the cells read so far need them, and the cell
+    styles only once a numeric cell needs checking for a date format.
+
+    :example:
+
+    with XlsxReader('parameter.xlsx') as reader:
+        for row in reader.rows('Parameters', stop=20):
+            print([cell.value for cell in row])
+    """
+
+    def __init__(self, filename):
+        """Entry point for :class:`XlsxReader`
+
+        :param filename: name of the xlsx workbook
+        :type filename: string"""
+        self.archive = zipfile.ZipFile(filename)
+        self._sheets = None
+        self._strings = None
+        self._string_parser = None
+        self._dates = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Close the workbook archive"""
+        self.archive.close()
+
+    def sheet_names(self):
+        """Retrieve the sheet names of the workbook
+
+        :return: sheet names
+        :rtype: list of strings"""
+        return [name for (name, _) in self._sheet_parts()]
+
+    def rows(self, sheet, stop=None):
+        """Produce the rows of a sheet
+
+        Rows are padded with empty cells up to their last populated cell,
+        and rows after the last populated one are left out. Unlike xlrd,
+        the sheet is not padded to cover merged cells, which are only listed
+        after the rows.
+
+        :param sheet: sheet name or index
+        :param stop: last row to read, counting from 1
+        :type sheet: string or integer
+        :type stop: integer or None
+        :return: cells of each row
+        :rtype: iterator of lists of :class:`XlsxCell`"""
+        from xml.etree.ElementTree import iterparse
+        parts = self._sheet_parts()
+        if isinstance(sheet, int):
+            part = parts[sheet][1]
+        else:
+            part = dict(parts).get(sheet)
+            if part is None:
+                raise KeyError('no sheet named {!r}'.format(sheet))
+
+        (ns, xpos, blank) = ('', 0, 0)
+        with self.archive.open(part) as stream:
+            for (event, node) in iterparse(stream, ('start-ns', 'end')):
+                if event == 'start-ns':
+                    if not node[0]:
+                        ns = '{%s}' % node[1]
+                    continue
+                if node.tag != ns + 'row':
+                    continue
+
+                number = node.get('r')
+                xpos = int(number) if number else xpos + 1
+                if stop is not None and xpos > stop:
+                    break
+
+                row = self._row(node, ns)
+                node.clear()
+                if not row:
+                    continue
+
+                # rows without cells are only kept once a later row has some
+                for _ in range(xpos - 1 - blank):
+                    yield []
+                blank = xpos
+                yield row
+
+    def _row(self, node, ns):
+        """Convert a row element to a list of cells"""
+        (row, value_tag) = ([], ns + 'v')
+        for cell in node:
+            ctype = cell.get('t', 'n')
+            if ctype == 'inlineStr':
+                value = ''.join(x.text or '' for x in cell.iter(ns + 't'))
+            else:
+                value = None
+                for child in cell:
+                    if child.tag == value_tag:
+                        value = child.text
+                # formulas that were never calculated have empty values, xlrd
+                # leaves them empty as well
+                if not value:
+                    continue
+
+            ref = cell.get('r')
+            ypos = _xlsx_column(ref) if ref else len(row)
+            if ypos > len(row):
+                row.extend([_EMPTY_CELL] * (ypos - len(row)))
+            if ctype == 's':
+                row.append(XlsxCell(TEXT, self._string(int(value))))
+            elif ctype in ('str', 'inlineStr', 'd'):
+                # ISO dates are kept as their text
+                row.append(XlsxCell(TEXT, value))
+            elif ctype == 'b':
+                row.append(XlsxCell(BOOLEAN, int(value)))
+            elif ctype == 'e':
+                row.append(XlsxCell(ERROR, _XLSX_ERRORS.get(value, 0x2A)))
+            else:
+                style = cell.get('s')
+                row.append(XlsxCell(
+                    DATE if style and int(style) in self._date_styles()
+                    else NUMBER, float(value)))
+
+        return row
+
+    def _sheet_parts(self):
+        """Names and archive paths of the sheets, in workbook order"""
+        if self._sheets is None:
+            from xml.etree import ElementTree
+            workbook = ElementTree.fromstring(
+                self.archive.read('xl/workbook.xml'))
+            try:
+                rels = ElementTree.fromstring(
+                    self.archive.read('xl/_rels/workbook.xml.rels'))
+            except KeyError:
+                rels = []
+
+            targets = dict((x.get('Id'), x.get('Target')) for x in rels.iter()
+                           if x.get('Id') is not None) if len(rels) else {}
+            sheets = []
+            for node in workbook.iter():
+                if node.tag.rsplit('}', 1)[-1] != 'sheet':
+                    continue
+                rid = [value for (key, value) in node.attrib.items()
+                       if key.rsplit('}', 1)[-1] == 'id']
+                target = targets.get(rid[0] if rid else None,
+                                     'worksheets/sheet{}.xml'.format(
+                                         len(sheets) + 1))
+                sheets.append((node.get('name'), target[1:]
+                               if target.startswith('/')
+                               else 'xl/' + target))
+            self._sheets = sheets
+
+        return self._sheets
+
+    def _string(self, index):
+        """Retrieve a shared string, parsing the table only as far as needed"""
+        if self._strings is None:
+            self._strings = []
+            self._string_parser = self._parse_strings()
+
+        while index >= len(self._strings):
+            self._strings.append(next(self._string_parser))
+
+        return self._strings[index]
+
+    def _parse_strings(self):
+        """Produce the shared strings in table order"""
+        from xml.etree.ElementTree import iterparse
+        with self.archive.open('xl/sharedStrings.xml') as stream:
+            ns = ''
+            for (event, node) in iterparse(stream, ('start', 'end')):
+                if event == 'start':
+                    if not ns and '}' in node.tag:
+                        ns = node.tag[:node.tag.index('}')+1]
+                    continue
+                if node.tag != ns + 'si':
+                    continue
+
+                # rich text runs are joined, phonetic hints left out
+                text = node.find(ns + 't')
+                yield text.text or '' if text is not None else ''.join(
+                    x.findtext(ns + 't') or '' for x in node.iter(ns + 'r'))
+                node.clear()
+
+    def _date_styles(self):
+        """Indices of the cell styles with a date or time number format"""
+        if self._dates is None:
+            from xml.etree.ElementTree import iterparse
+            (formats, styles, ns) = (dict(), [], '')
+            try:
+                stream = self.archive.open('xl/styles.xml')
+            except KeyError:
+                self._dates = frozenset()
+                return self._dates
+
+            with stream:
+                for (event, node) in iterparse(stream, ('start', 'end')):
+                    if event == 'start':
+                        if not ns and '}' in node.tag:
+                            ns = node.tag[:node.tag.index('}')+1]
+                        continue
+                    if node.tag == ns + 'numFmt':
+                        formats[int(node.get('numFmtId'))] = \
+                            _is_date_format(node.get('formatCode', ''))
+                    elif node.tag == ns + 'cellXfs':
+                        styles = [int(x.get('numFmtId', 0))
+                                  for x in node.iter(ns + 'xf')]
+                        break
+
+            self._dates = frozenset(
+                ind for (ind, fmt) in enumerate(styles)
+                if formats.get(fmt, fmt in _XLSX_DATE_FORMATS))
+
+        return self._dates
+
+
+def _xlsx_column(ref):
+    """Convert a cell reference such as 'AB12' to its 0-based column"""
+    letters = ref.rstrip('0123456789')
+    col = _XLSX_COLUMNS.get(letters)
+    if col is None:
+        col = -1
+        for letter in letters:
+            col = (col + 1)*26 + ord(letter) - 65
+        _XLSX_COLUMNS[letters] = col
+    return col
+
+
+def _is_date_format(code):
+    """Check whether a number format code shows a date or time"""
+    code = _XLSX_LITERALS.sub('', code).lower()
+    return code != 'general' and any(x in code for x in 'ymdhs')
 
 
 def loadtxt(filename, dtype='float', comments='#', delimiter=None, skiprows=0,
@@ -67,9 +686,77 @@ def load(file, mmap_mode=None, allow_pickle=True, fix_imports=True,
     return np.load(file, mmap_mode, allow_pickle, fix_imports, encoding)
 
 
+def frame_starts(location):
+    """Find the first row of each frame of a COMSOL export
+
+    COMSOL exports every time step of a variable one after another, a new
+    frame starts wherever the location decreases.
+
+    :param location: location column of the export
+    :type location: array
+    :return: row offsets of the frames
+    :rtype: array"""
+    return np.insert(np.nonzero(np.diff(location) < 0)[0]+1, 0, 0)
+
+
+def save_dataset(path, data):
+    """Write COMSOL variables as an uncompressed, memory-mappable dataset
+
+    Each variable is written to its own ``<name>.npy`` file. The mesh and the
+    frame offsets of every two-column export are kept in a small
+    :data:`DATASET_METADATA` file, so the dataset can be opened without
+    reading any variable.
+
+    :example:
+
+    save_dataset('guwang2', load('guwang2.npz'))
+
+    :param path: directory to write the dataset to
+    :param data: mesh and variables, e.g. the contents of a .npz archive
+    :type path: string
+    :type data: mapping of names to arrays"""
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    metadata = dict()
+    for name in data.keys():
+        array = np.asarray(data[name])
+        if name == 'mesh':
+            metadata['mesh'] = array
+            continue
+
+        np.save(os.path.join(path, name + '.npy'), array)
+        if array.ndim == 2 and array.shape[1] == 2:
+            metadata[name + _FRAMES] = frame_starts(array[:, 0])
+
+    np.savez(os.path.join(path, DATASET_METADATA), **metadata)
+
+
+@instrument.instrumented
+def load_dataset(path, mmap_mode='r'):
+    """Open a dataset written by :func:`save_dataset`
+
+    Variables are memory-mapped by default, so opening a dataset reads only
+    its metadata and only the frames that are used are paged in.
+
+    :param path: dataset directory
+    :param mmap_mode: memory-map mode of the variables, None to read them
+    :type path: string
+    :type mmap_mode: string or None
+    :return: dataset
+    :rtype: :class:`Dataset`"""
+    return Dataset(path, mmap_mode)
+
+
+@instrument.instrumented
 def read_csv(filename, start=1, stop=None, assume=TEXT):
     """Read a csv file into a :class:`Spreadsheet`
 
+    Rows are streamed from the file: rows before ``start`` are skipped and
+    reading ends at ``stop``, so only the requested window is held in memory.
+    Numeric data (e.g. ``assume=NUMBER``) is parsed straight into a float
+    array.
+
     :example:
 
     sheet = read_csv('parameters.csv', start=9, assume=NUMBER)
@@ -84,21 +771,47 @@ def read_csv(filename, start=1, stop=None, assume=TEXT):
     :type assume: integer
     :return: spreadsheet data
     :rtype: :class:`Spreadsheet`"""
-    values = []
     spreadsheet = Spreadsheet(assume)
     with open(filename) as csvfile:
-        reader = csv.reader(csvfile)
-        for row in reader:
-            values.append(row)
-
-    if stop is None:
-        stop = len(values)
+        rows = itertools.islice(csv.reader(csvfile), start-1, stop)
+        if assume in _NUMERIC:
+            nrows = None if stop is None else max(stop-start+1, 0)
+            spreadsheet.set_values(_read_numeric(rows, nrows))
+        else:
+            spreadsheet.set_values(list(rows))
 
-    values = values[start-1:stop]
-    spreadsheet.set_values(values)
     return spreadsheet
 
 
+def _read_numeric(rows, nrows=None):
+    """Parse rows of numeric strings into a preallocated float array
+
+    :param rows: rows of values to parse
+    :param nrows: expected number of rows, if known
+    :type rows: iterator of lists
+    :type nrows: integer or None
+    :return: parsed values
+    :rtype: array"""
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return np.empty((0, 0))
+
+    data = np.empty((nrows or 1024, len(first)))
+    data[0] = first
+    count = 1
+    for row in rows:
+        if count == len(data):
+            # the window size is unknown, grow geometrically
+            data = np.resize(data, (2*len(data), data.shape[1]))
+        data[count] = row
+        count += 1
+
+    # a view would keep the unused rows of the buffer alive
+    return data if count == len(data) else data[:count].copy()
+
+
+@instrument.instrumented
 def load_mat(filename, variable):
     """Read the variable from filename
 
@@ -112,16 +825,19 @@ def load_mat(filename, variable):
     :type variable: string
     :return: variable data
     :rtype: array"""
+    import scipy.io as sio
     contents = sio.loadmat(filename)
     return contents[variable]
 
 
+@instrument.instrumented
 def load_section(sheet, row_range=None, col_range=None):
     """Read a 'chunk' of data from a spreadsheet.
 
     Given a selection of rows and columns, this function will return the
     intersection of the two ranges. Note that the minimum value for each range
-    is 1.
+    is 1. Contiguous selections, e.g. ``range(7, 42)``, are returned as views
+    of the sheet data rather than copies.
 
     :example:
 
@@ -132,32 +848,70 @@ def load_section(sheet, row_range=None, col_range=None):
     :param sheet: spreadsheet data
     :param row_range: selected rows
     :param col_range: selected columns
-    :type sheet: :class:`xlrd.sheet`
+    :type sheet: :class:`Spreadsheet`
     :type row_range: list of integers or integer
     :type col_range: list of integers or integer
     :return: section of sheet data
-    :rtype: array if assume=NUMBER else list"""
+    :rtype: array if assume=NUMBER else :class:`Spreadsheet`"""
+
+    (nrows, ncols) = sheet.size()
+    rows = _selection(row_range, nrows)
+    cols = _selection(col_range, ncols)
 
-    if row_range is None:
-        row_range = range(1, len(sheet.values)+1)
+    if sheet.assume == NUMBER:
+        return sheet.section_numbers(rows, cols)
 
-    if col_range is None:
-        col_range = range(1, len(sheet.values[0])+1)
+    return sheet.section(rows, cols)
 
-    if isinstance(row_range, int):
-        row_range = [row_range]
 
-    if isinstance(col_range, int):
-        col_range = [col_range]
+def _selection(selection, size):
+    """Convert a 1-based row or column selection to a 0-based index
 
-    rval = [[sheet.cell(x-1, y-1) for y in col_range] for x in row_range]
+    Contiguous selections are converted to slices so that indexing with them
+    returns a view.
 
-    if sheet.assume == NUMBER:
-        return np.array(
-            [[rval[x-1][y-1].value for y in col_range] for x in row_range],
-            dtype='float')
+    :param selection: selected rows or columns
+    :param size: number of rows or columns available
+    :type selection: list of integers or integer or None
+    :type size: integer
+    :return: 0-based index
+    :rtype: slice or array"""
+    if selection is None:
+        return slice(0, size)
+
+    if isinstance(selection, int):
+        selection = [selection]
 
-    return rval
+    index = np.asarray(selection, dtype=np.intp) - 1
+    if index.size and (index.min() < 0 or index.max() >= size):
+        raise IndexError('selection out of range: {}'.format(selection))
+
+    if index.size and np.all(np.diff(index) == 1):
+        return slice(int(index[0]), int(index[-1]) + 1)
+
+    return index
+
+
+# matlab operators and their numexpr equivalents
+_OPERATORS = {
+    './': '/',
+    '.*': '*',
+    '.^': '**'
+}
+
+_FUNCTION_DEF = re.compile(r'\@\(.*?\)')
+_FUNCTION_VAR = re.compile(r'\@|\(|\)')
+_BRACES = re.compile('{|}')
+
+# compiled regular expressions of _multiple_replace, keyed by the replaced text
+_REPLACE_PATTERNS = dict()
+
+# parsed anonymous functions keyed by their source string
+_FUNCTIONS = dict()
+
+# compiled numexpr programs of each thread keyed by expression and variable
+# names, as a program must not run in two threads at once
+_PROGRAMS = threading.local()
 
 
 def _multiple_replace(repl, text):
@@ -169,17 +923,311 @@ def _multiple_replace(repl, text):
     :type text: string
     :return: processed text
     :rtype: string"""
-    # Create a regular expression  from the dictionary keys
-    regex = re.compile("(%s)" % "|".join(map(re.escape, repl.keys())))
+    # Create a regular expression from the dictionary keys, once per set of
+    # keys
+    keys = tuple(sorted(repl.keys()))
+    regex = _REPLACE_PATTERNS.get(keys)
+    if regex is None:
+        regex = re.compile("(%s)" % "|".join(map(re.escape, keys)))
+        _REPLACE_PATTERNS[keys] = regex
 
     # For each match, look-up corresponding value in dictionary
     return regex.sub(lambda mo: repl[mo.string[mo.start():mo.end()]], text)
 
 
+def _compile(expression, variables):
+    """Compile an expression to a numexpr program, reusing cached programs
+
+    :param expression: numexpr expression
+    :param variables: names of the expression arguments
+    :type expression: string
+    :type variables: tuple of strings
+    :return: compiled program, the positions of the arguments it uses,
+        whether it uses VML functions and the thread it belongs to
+    :rtype: tuple"""
+    programs = getattr(_PROGRAMS, 'programs', None)
+    if programs is None:
+        programs = _PROGRAMS.programs = dict()
+    key = (expression, variables)
+    try:
+        return programs[key]
+    except KeyError:
+        pass
+
+    import numexpr as ne
+    from numexpr.necompiler import getExprNames
+
+    # numexpr rejects signatures naming variables the expression never uses
+    used = tuple(i for (i, name) in enumerate(variables)
+                 if re.search(r'\b%s\b' % re.escape(name), expression))
+    program = ne.NumExpr(
+        expression, signature=[(variables[i], np.float64) for i in used])
+    uses_vml = getExprNames(expression, {})[1]
+    return programs.setdefault(
+        key, (program, used, uses_vml, threading.current_thread()))
+
+
+class _Expression(object):
+    """Callable numexpr expression of a parsed anonymous function
+
+    The expression is compiled on its first call in each thread; later calls
+    only bind the arguments and run the cached program."""
+
+    __slots__ = ('expression', 'variables', '_program')
+
+    def __init__(self, expression, variables):
+        """Entry point for :class:`_Expression`
+
+        :param expression: numexpr expression
+        :param variables: names of the expression arguments
+        :type expression: string
+        :type variables: tuple of strings"""
+        self.expression = expression
+        self.variables = variables
+        self._program = None
+
+    def _compiled(self):
+        """Compiled program of the calling thread, see :func:`_compile`"""
+        compiled = self._program
+        if compiled is None or compiled[3] is not threading.current_thread():
+            compiled = self._program = _compile(self.expression,
+                                                self.variables)
+        return compiled
+
+    @instrument.instrumented
+    def __call__(self, *args):
+        (program, used, _, _) = self._compiled()
+        return program(*[np.asarray(args[i], dtype=np.float64) for i in used])
+
+    def evaluate(self, args, out):
+        """Evaluate the expression into an existing array
+
+        :param args: float64 arguments
+        :param out: array to write the result to, broadcast if the arguments
+            the expression uses have a different shape
+        :type args: list of arrays
+        :type out: array"""
+        (program, used, uses_vml, _) = self._compiled()
+        inputs = [args[i] for i in used]
+        if inputs and out.flags.c_contiguous and \
+                np.broadcast(*inputs).shape == out.shape:
+            program(*inputs, out=out, order='K', casting='safe',
+                    ex_uses_vml=uses_vml)
+        else:
+            out[...] = program(*inputs)
+
+    def __reduce__(self):
+        # compiled programs cannot be pickled, workers compile their own
+        return (_Expression, (self.expression, self.variables))
+
+    def __repr__(self):
+        return '_Expression(@({}) {})'.format(
+            ','.join(self.variables), self.expression)
+
+
+class FusedFunction(list):
+    """Components of a parsed anonymous function, evaluated together
+
+    Indexing gives the callable of each component, as a list does. Calling
+    the function evaluates every component over the same arguments straight
+    into one preallocated stacked array, converting the arguments once.
+
+    :example:
+
+    uocp = _fun_to_lambda('{(@(x,T) x.*T), (@(x,T) x + T)}')
+    values = uocp(x, temperature) # values[0] is x*T, values[1] is x + T
+    """
+
+    __slots__ = ()
+
+    @instrument.instrumented
+    def __call__(self, *args, **kwargs):
+        """Evaluate every component
+
+        :param args: arguments shared by the components
+        :param out: array of shape (components,) + argument shape to write
+            to, allocated if not given
+        :type args: arrays or floats
+        :type out: array
+        :return: result of each component
+        :rtype: array"""
+        args = [np.asarray(x, dtype=np.float64) for x in args]
+        out = kwargs.get('out')
+        if out is None:
+            shape = np.broadcast(*args).shape if args else ()
+            out = np.empty((len(self),) + shape)
+
+        # index with an ellipsis so that scalar arguments give 0-d views
+        for (ind, component) in enumerate(self):
+            component.evaluate(args, out[ind, ...])
+        return out
+
+
+class Interpolant(object):
+    """One-variable function tabulated on a uniform grid and evaluated by
+    linear interpolation
+
+    The grid is uniform so that the interval of each argument is found by
+    scaling rather than searching. Arguments outside of the grid take the
+    value at the nearest end.
+
+    :example:
+
+    uocp = tabulate(params['Uocp'][0], (0, 1), tolerance=1e-4)
+    print(uocp.max_error) # worst error against the expression
+    """
+
+    __slots__ = ('domain', 'values', 'max_error', '_scale', '_slopes')
+
+    def __init__(self, domain, values, max_error=np.nan):
+        """Entry point for :class:`Interpolant`
+
+        :param domain: first and last grid location
+        :param values: function values on the uniform grid
+        :param max_error: worst absolute error against the tabulated function
+        :type domain: tuple of floats
+        :type values: array
+        :type max_error: float"""
+        self.domain = tuple(float(x) for x in domain)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.max_error = float(max_error)
+        self._scale = (len(self.values) - 1)/(self.domain[1] - self.domain[0])
+        self._slopes = np.append(np.diff(self.values), 0)
+
+    @property
+    def grid(self):
+        """Locations of the tabulated values"""
+        return np.linspace(self.domain[0], self.domain[1], len(self.values))
+
+    @instrument.instrumented
+    def __call__(self, x):
+        position = np.array(x, dtype=np.float64)
+        position -= self.domain[0]
+        position *= self._scale
+        np.clip(position, 0, len(self.values) - 1, out=position)
+        # NaN arguments cannot index the table, they give NaN as expressions do
+        invalid = np.isnan(position)
+        if invalid.any():
+            position[invalid] = 0
+        index = position.astype(np.intp)
+        position -= index
+        position *= np.take(self._slopes, index)
+        position += np.take(self.values, index)
+        position[invalid] = np.nan
+        return position
+
+    def evaluate(self, args, out):
+        """Evaluate the interpolant into an existing array, see
+        :meth:`_Expression.evaluate`"""
+        out[...] = self(args[0])
+
+    def __reduce__(self):
+        return (Interpolant, (self.domain, self.values, self.max_error))
+
+    def __repr__(self):
+        return 'Interpolant([{:g}, {:g}], {} points, max_error={:.3g})'.format(
+            self.domain[0], self.domain[1], len(self.values), self.max_error)
+
+
+def tabulate(function, domain, points=1001, tolerance=None, check=8,
+             max_points=1 << 20):
+    """Tabulate a one-variable function on a uniform grid
+
+    The worst-case error is measured against the function on a grid
+    ``check`` times finer than the table. Given a tolerance, the grid is
+    refined until the error is within it.
+
+    :param function: function of one array argument
+    :param domain: lowest and highest tabulated argument
+    :param points: number of grid points
+    :param tolerance: largest acceptable absolute error
+    :param check: refinement of the error check grid
+    :param max_points: largest number of grid points when refining
+    :type function: callable
+    :type domain: tuple of floats
+    :type points: integer
+    :type tolerance: float or None
+    :type check: integer
+    :type max_points: integer
+    :return: tabulated function
+    :rtype: :class:`Interpolant`"""
+    (low, high) = domain
+    if not high > low or points < 2:
+        raise ValueError('cannot tabulate {} points over {}'.format(
+            points, domain))
+
+    while True:
+        grid = np.linspace(low, high, points)
+        table = Interpolant(domain, np.broadcast_to(function(grid),
+                                                    grid.shape))
+        fine = np.linspace(low, high, (points - 1)*max(check, 1) + 1)
+        table.max_error = float(np.max(np.abs(table(fine) - function(fine))))
+        if tolerance is None or table.max_error <= tolerance or \
+                points >= max_points:
+            return table
+        points = min(2*points - 1, max_points)
+
+
+def tabulate_params(params, domains, points=1001, tolerance=None,
+                    components=(0,)):
+    """Replace parameter functions by tabulated interpolants
+
+    :example:
+
+    params['neg'] = tabulate_params(params['neg'], {'Uocp': (0, 1)})
+
+    :param params: mapping of parameter names to values
+    :param domains: tabulated domain of each function to tabulate
+    :param points: number of grid points
+    :param tolerance: largest acceptable absolute error, see :func:`tabulate`
+    :param components: components of each function to tabulate, the others
+        are kept as expressions
+    :type params: dict
+    :type domains: dict
+    :type points: integer
+    :type tolerance: float or None
+    :type components: tuple of integers
+    :return: copy of the parameters with tabulated functions
+    :rtype: dict"""
+    params = dict(params)
+    for (name, domain) in domains.items():
+        functions = FusedFunction(params[name])
+        for ind in components:
+            functions[ind] = tabulate(functions[ind], domain, points,
+                                      tolerance)
+        params[name] = functions
+
+    return params
+
+
+def _split_components(text):
+    """Split a cell array body on the commas outside of any brackets
+
+    :param text: comma separated components
+    :type text: string
+    :return: components
+    :rtype: list of strings"""
+    (components, depth, start) = ([], 0, 0)
+    for (ind, char) in enumerate(text):
+        if char in '([':
+            depth += 1
+        elif char in ')]':
+            depth -= 1
+        elif char == ',' and depth == 0:
+            components.append(text[start:ind])
+            start = ind + 1
+    components.append(text[start:])
+    return components
+
+
 def _fun_to_lambda(entry):
     """Convert a given string representing a matlab anonymous
     function to a lambda function
 
+    A cell array of functions, e.g. ``{@(x) x.^2, @(x) 2.*x}``, gives one
+    component per function and functions may take several arguments, e.g.
+    ``@(x,T) x.*T``. Parsed functions are cached by their source string.
+
     :example:
     lambdafun = "@(x) cos(x)"
     lambdafun(np.pi)
@@ -187,31 +1235,32 @@ def _fun_to_lambda(entry):
     :param entry: string of matlab anonymous equation
     :type: string
     :return: mathmatical function
-    :rtype: lambda function"""
-
-    repl = {
-        './': '/',
-        '.*': '*',
-        '.^': '**'
-    }
+    :rtype: :class:`FusedFunction`"""
 
-    # pull out function variable definition
-    vari = re.findall(r'\@\(.*?\)', entry)
-    vari = [re.sub(r'\@|\(|\)', '', x) for x in vari]
-
-    # remove variable definition
-    entry = re.sub(r'\@\(.*?\)', '', entry)
+    functions = _FUNCTIONS.get(entry)
+    if functions is not None:
+        return FusedFunction(functions)
 
     # replace operators to suit numpy
-    entry = _multiple_replace(repl, entry)
+    expression = _multiple_replace(_OPERATORS, entry)
 
-    # separate equations into different functions
-    entry = re.sub('{|}', '', entry).split(',')
+    # separate equations into different functions, keeping the commas of
+    # argument lists and function calls
+    functions = []
+    for component in _split_components(_BRACES.sub('', expression)):
+        # pull out and remove the function variable definition
+        definition = _FUNCTION_DEF.findall(component)
+        variables = tuple(x.strip() for x in _FUNCTION_VAR.sub(
+            '', definition[0]).split(',') if x.strip()) if definition else ()
+        functions.append(_Expression(
+            _FUNCTION_DEF.sub('', component).strip(), variables))
 
-    return list(lambda x, z=i: ne.evaluate(entry[z], local_dict={vari[z]: x})
-                for i in range(0, len(entry)))
+    functions = tuple(functions)
+    _FUNCTIONS[entry] = functions
+    return FusedFunction(functions)
 
 
+@instrument.instrumented
 def load_params(sheet, rows=None, ncols=None, pcols=None, cols=None,
                 nrows=None, prows=None):
     """Read designated parameters from the sheet
@@ -250,54 +1299,445 @@ def load_params(sheet, rows=None, ncols=None, pcols=None, cols=None,
     data_cells = load_section(sheet, prows, pcols)
 
     # Verify the number of names matches the number of params
-    assert len(name_cells) == len(data_cells)
+    assert name_cells.size()[0] == data_cells.size()[0]
+
+    return _build_params(name_cells.ravel(), data_cells.ctypes.ravel(),
+                         data_cells.ravel())
+
+
+@instrument.instrumented
+def load_blocks(sheet, layout, ncols=2, pcols=3):
+    """Read several parameter blocks from the sheet in a single pass
+
+    The rows of all blocks are gathered from the name and data columns with
+    one index into the sheet arrays, then split into one parameter mapping
+    per block.
+
+    :example:
+
+    sheet = read_excel('parameter_list.xlsx', 0)
+    params = load_blocks(sheet, {'const': range(7, 15),
+                                 'neg': range(18, 43)}, ncols=2, pcols=3)
+
+    :param sheet: spreadsheet data
+    :param layout: cell rows of each parameter block
+    :param ncols: cell column of the parameter names
+    :param pcols: cell column of the parameter data
+    :type sheet: :class:`Spreadsheet`
+    :type layout: dict
+    :type ncols: integer
+    :type pcols: integer
+    :return: mapping of block names to parameter mappings
+    :rtype: dict"""
+    (names, ctypes, values) = _read_blocks(sheet, layout, ncols, pcols)
+    return dict((block, _build_params(names[block], ctypes[block],
+                                      values[block]))
+                for block in layout)
+
+
+def _read_blocks(sheet, layout, ncols, pcols):
+    """Read the names, cell types and values of parameter blocks
+
+    :return: mappings of block names to names, cell types and values
+    :rtype: tuple of dicts"""
+    nrows = sheet.size()[0]
+    blocks = list(layout.items())
+    index = [np.arange(nrows)[_selection(rows, nrows)] for (_, rows) in blocks]
+    rows = np.concatenate(index) if index else np.empty(0, dtype=np.intp)
+
+    names = sheet.section(rows, _selection(ncols, sheet.size()[1])).ravel()
+    data = sheet.section(rows, _selection(pcols, sheet.size()[1]))
+    (ctypes, values) = (data.ctypes.ravel().tolist(), data.ravel())
+
+    result = (dict(), dict(), dict())
+    stop = 0
+    for ((block, _), block_rows) in zip(blocks, index):
+        (start, stop) = (stop, stop+len(block_rows))
+        for (out, column) in zip(result, (names, ctypes, values)):
+            out[block] = column[start:stop]
+
+    return result
+
+
+def _build_params(names, ctypes, values):
+    """Map parameter names to numbers and functions
+
+    :param names: parameter names
+    :param ctypes: cell types of the parameter values
+    :param values: parameter values or expressions
+    :type names: list of strings
+    :type ctypes: list of integers
+    :type values: list
+    :return: mapping of parameter names to values
+    :rtype: dict"""
+    data = [_fun_to_lambda(x) if ctype == TEXT else
+            float(x) if ctype == NUMBER else None
+            for (ctype, x) in zip(ctypes, values)]
+
+    return dict(zip(names, data))
 
-    data = [_fun_to_lambda(x.value) if x.ctype == TEXT else
-            x.value if x.ctype == NUMBER else None
-            for y in data_cells for x in y]
 
-    return dict(zip([x.value for y in name_cells for x in y], data))
+@instrument.instrumented
+def load_param_bundle(filename, layout, sheet=0, ncols=2, pcols=3,
+                      cache_dir=None, tables=None, points=1001,
+                      tolerance=None):
+    """Read parameter blocks from a workbook through a persisted bundle
+
+    The numeric values, expression strings and block layout read from the
+    workbook are saved to a binary bundle in ``cache_dir``, keyed by a hash
+    of the workbook contents, sheet and layout. Later calls rebuild the
+    :func:`load_params` dicts from the bundle without opening the workbook.
+
+    Functions named in ``tables`` have their first component replaced by an
+    :class:`Interpolant`, see :func:`tabulate_params`, and the tables are
+    saved in the bundle too.
+
+    :example:
+
+    params = load_param_bundle(
+        'parameter_list.xlsx', {'const': range(7, 15), 'neg': range(18, 43)})
+
+    :param filename: name of the excel workbook
+    :param layout: rows of each parameter block
+    :param sheet: spreadsheet name or index
+    :param ncols: cell column of the parameter names
+    :param pcols: cell column of the parameter data
+    :param cache_dir: bundle directory, defaults to :func:`cache_directory`
+    :param tables: tabulated domain of functions by block and name, e.g.
+        ``{'neg': {'Uocp': (0, 1)}}``
+    :param points: number of grid points of the tables
+    :param tolerance: largest acceptable absolute error of the tables
+    :type filename: string
+    :type layout: dict
+    :type sheet: string or integer
+    :type ncols: integer
+    :type pcols: integer
+    :type cache_dir: string or None
+    :type tables: dict or None
+    :type points: integer
+    :type tolerance: float or None
+    :return: mapping of block names to parameter mappings
+    :rtype: dict"""
+    spec = {
+        'sheet': sheet, 'ncols': ncols, 'pcols': pcols,
+        'layout': dict((block, rows if isinstance(rows, int) else list(rows))
+                       for (block, rows) in layout.items())}
+    if tables:
+        spec['tables'] = dict(
+            (block, dict((name, [float(x) for x in domain])
+                         for (name, domain) in domains.items()))
+            for (block, domains) in tables.items())
+        spec['points'] = points
+        spec['tolerance'] = tolerance
+    spec = json.dumps(spec, sort_keys=True)
+
+    digest = hashlib.sha256()
+    with open(filename, 'rb') as workbook:
+        for chunk in iter(lambda: workbook.read(1 << 20), b''):
+            digest.update(chunk)
+    digest.update(spec.encode('utf-8'))
+
+    cache_dir = cache_directory() if cache_dir is None else cache_dir
+    bundle = os.path.join(cache_dir, digest.hexdigest() + '.npz')
+    if os.path.exists(bundle):
+        try:
+            return _read_bundle(bundle, spec)
+        except (IOError, KeyError, ValueError, EOFError,
+                zipfile.BadZipfile):
+            # unreadable bundles are rebuilt from the workbook
+            pass
+
+    (names, ctypes, values) = _read_blocks(
+        read_excel(filename, sheet), layout, ncols, pcols)
+    blocks = dict((block, (names[block], ctypes[block], values[block]))
+                  for block in layout)
+    params = dict((block, _build_params(*entries))
+                  for (block, entries) in blocks.items())
+    for (block, domains) in (tables or {}).items():
+        params[block] = tabulate_params(params[block], domains, points,
+                                        tolerance)
+
+    _write_bundle(bundle, spec, blocks, params)
+    return params
+
+
+def cache_directory():
+    """Directory of persisted coslib caches
+
+    Set by the ``COSLIB_CACHE_DIR`` environment variable, defaults to
+    ``~/.cache/coslib``.
+
+    :return: cache directory
+    :rtype: string"""
+    return os.environ.get('COSLIB_CACHE_DIR', os.path.join(
+        os.path.expanduser('~'), '.cache', 'coslib'))
+
+
+def _write_bundle(bundle, spec, blocks, params=None):
+    """Save parameter blocks to an uncompressed bundle
+
+    :param bundle: name of the bundle file
+    :param spec: JSON description of the block layout
+    :param blocks: names, cell types and values of each block
+    :param params: parameters holding the tables named in the spec
+    :type bundle: string
+    :type spec: string
+    :type blocks: dict
+    :type params: dict"""
+    tables = [(block, name, params[block][name][0]) for (block, domains) in
+              sorted(json.loads(spec).get('tables', {}).items())
+              for name in sorted(domains)]
+    (block_names, names, ctypes, numbers, expressions) = ([], [], [], [], [])
+    for (block, (param_names, param_ctypes, values)) in blocks.items():
+        for (name, ctype, value) in zip(param_names, param_ctypes, values):
+            block_names.append(block)
+            names.append(name)
+            ctypes.append(ctype)
+            numbers.append(value if ctype in _NUMERIC else np.nan)
+            expressions.append(value if ctype == TEXT else '')
+
+    directory = os.path.dirname(bundle)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    # write to a temporary file first so readers never see partial bundles
+    (handle, temp) = tempfile.mkstemp(suffix='.npz', dir=directory)
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            np.savez(out, spec=np.array(spec), blocks=np.array(block_names),
+                     names=np.array(names), ctypes=np.array(ctypes, 'int8'),
+                     numbers=np.array(numbers, 'float'),
+                     expressions=np.array(expressions),
+                     table_domains=np.array(
+                         [x.domain for (_, _, x) in tables]),
+                     # tables refined to a tolerance differ in length
+                     table_values=np.concatenate(
+                         [x.values for (_, _, x) in tables] + [[]]),
+                     table_offsets=np.cumsum(
+                         [0] + [len(x.values) for (_, _, x) in tables]),
+                     table_errors=np.array(
+                         [x.max_error for (_, _, x) in tables]))
+        # os.replace is atomic on every platform but missing on Python 2
+        getattr(os, 'replace', os.rename)(temp, bundle)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+
+
+def _read_bundle(bundle, spec):
+    """Rebuild parameter blocks from a bundle
+
+    :param bundle: name of the bundle file
+    :param spec: expected JSON description of the block layout
+    :type bundle: string
+    :type spec: string
+    :return: mapping of block names to parameter mappings
+    :rtype: dict"""
+    with np.load(bundle, allow_pickle=False) as contents:
+        if str(contents['spec']) != spec:
+            raise ValueError('Bundle layout does not match')
+
+        (blocks, names, ctypes, numbers, expressions) = (
+            contents[x].tolist() for x in
+            ('blocks', 'names', 'ctypes', 'numbers', 'expressions'))
+        (values, offsets) = (contents['table_values'],
+                             contents['table_offsets'])
+        tables = [Interpolant(domain, values[start:stop], error)
+                  for (domain, start, stop, error) in zip(
+                      contents['table_domains'], offsets[:-1], offsets[1:],
+                      contents['table_errors'])]
+
+    entries = dict((block, ([], [], []))
+                   for block in json.loads(spec)['layout'])
+    for (block, name, ctype, number, expression) in zip(
+            blocks, names, ctypes, numbers, expressions):
+        entry = entries[block]
+        entry[0].append(name)
+        entry[1].append(ctype)
+        entry[2].append(expression if ctype == TEXT else number)
+
+    params = dict((block, _build_params(*entry))
+                  for (block, entry) in entries.items())
+    names = [(block, name) for (block, domains) in
+             sorted(json.loads(spec).get('tables', {}).items())
+             for name in sorted(domains)]
+    if len(names) != len(tables):
+        raise ValueError('Bundle tables do not match')
+    for ((block, name), table) in zip(names, tables):
+        params[block][name] = FusedFunction(params[block][name])
+        params[block][name][0] = table
+
+    return params
 
 
 class Spreadsheet(object):
-    """Hold spreadsheet data"""
+    """Hold spreadsheet data
+
+    Cell data is stored column-wise in compact arrays rather than as
+    per-cell objects: numeric cells (numbers, dates, booleans and error
+    codes) in the float64 array :attr:`numbers`, cell types in the int8
+    array :attr:`ctypes` and text cells as indices into the :attr:`strings`
+    table held in the int32 array :attr:`text`."""
 
     def __init__(self, assumption=None):
         """Entry point for :class:`Spreadsheet`"""
-        self.values = None
+        self.numbers = None
         self.ctypes = None
+        self.text = None
+        self.strings = []
         self.assume = assumption
 
+    def _allocate(self, nrows, ncols):
+        """Allocate empty storage for a sheet of the given dimensions"""
+        self.numbers = np.full((nrows, ncols), np.nan)
+        self.ctypes = np.full((nrows, ncols), EMPTY, dtype=np.int8)
+        self.text = np.full((nrows, ncols), -1, dtype=np.int32)
+        self.strings = []
+
     def set_data(self, data_in):
         """Set spreadsheet data using cell generators"""
         data = list(data_in)
-        self.values = [[col.value for col in row] for row in data]
-        self.ctypes = [[col.ctype for col in row] for row in data]
+        self._allocate(len(data), max([len(row) for row in data] or [0]))
+        strings = dict()
+        for (xpos, row) in enumerate(data):
+            ncols = len(row)
+            ctypes = [col.ctype for col in row]
+            self.ctypes[xpos, :ncols] = ctypes
+            self.numbers[xpos, :ncols] = [
+                col.value if ctype in _NUMERIC else np.nan
+                for (ctype, col) in zip(ctypes, row)]
+            self.text[xpos, :ncols] = [
+                strings.setdefault(col.value, len(strings))
+                if ctype == TEXT else -1
+                for (ctype, col) in zip(ctypes, row)]
+
+        self.strings = sorted(strings, key=strings.get)
 
     def set_values(self, values):
         """Set spreadsheet cell values
 
+        Values are stored as numbers if the spreadsheet assumes a numeric
+        cell type and as text otherwise.
+
         :param values: values to set
-        :type values: container, e.g. list"""
-        self.values = values
+        :type values: container, e.g. list or array"""
+        ctype = TEXT if self.assume is None else self.assume
+        if ctype in _NUMERIC:
+            self.numbers = np.atleast_2d(np.asarray(values, dtype='float'))
+            self.ctypes = np.full(self.numbers.shape, ctype, dtype=np.int8)
+            self.text = np.full(self.numbers.shape, -1, dtype=np.int32)
+            self.strings = []
+            return
+
+        values = list(values)
+        self._allocate(len(values), max([len(row) for row in values] or [0]))
+        strings = dict()
+        for (xpos, row) in enumerate(values):
+            self.ctypes[xpos, :len(row)] = ctype
+            self.text[xpos, :len(row)] = [
+                strings.setdefault(x, len(strings)) for x in row]
+
+        self.strings = sorted(strings, key=strings.get)
 
     def set_ctypes(self, ctype):
         """Set spreadsheet cell types. I.e. NUMBER, TEXT, etc.
 
         :param ctype: cell types to set
         :type values: container, e.g. list"""
-        self.ctypes = ctype
+        self.ctypes = np.asarray(ctype, dtype=np.int8)
+
+    @property
+    def values(self):
+        """Cell values as nested lists, built on demand"""
+        if self.ctypes is None:
+            return None
+
+        (nrows, ncols) = self.size()
+        cells = self.ravel()
+        return [cells[x*ncols:(x+1)*ncols] for x in range(nrows)]
 
     def size(self):
         """Retrieve the dimensions of the spreadsheet
 
         :return: spreadsheed dimensions
         :rtype: tuple"""
-        if self.values is not None:
-            return len(self.values), len(self.values[0])
+        if self.ctypes is not None:
+            return self.ctypes.shape
         else:
             return None
 
+    def density(self):
+        """Retrieve the fraction of populated cells
+
+        :return: populated cells over all cells
+        :rtype: float"""
+        return float(np.mean(self.ctypes != EMPTY)) if self.ctypes.size \
+            else 0.0
+
+    def value(self, xpos, ypos):
+        """Retrieve a cell value
+
+        :param xpos: cell row
+        :param ypos: cell column
+        :type xpos: integer
+        :type ypos: integer
+        :return: cell value
+        :rtype: float, integer or string"""
+        ctype = self.ctypes[xpos, ypos]
+        if ctype == TEXT:
+            return self.strings[self.text[xpos, ypos]]
+        elif ctype in (BOOLEAN, ERROR):
+            return int(self.numbers[xpos, ypos])
+        elif ctype in _NUMERIC:
+            return float(self.numbers[xpos, ypos])
+        else:
+            return ''
+
+    def ravel(self):
+        """Retrieve all cell values in row-major order
+
+        :return: cell values
+        :rtype: list"""
+        strings = self.strings
+        return [strings[text] if ctype == TEXT else
+                int(number) if ctype in (BOOLEAN, ERROR) else
+                number if ctype in _NUMERIC else ''
+                for (ctype, number, text) in zip(
+                    self.ctypes.ravel().tolist(),
+                    self.numbers.ravel().tolist(),
+                    self.text.ravel().tolist())]
+
+    def section(self, rows, cols):
+        """Select a section of the spreadsheet
+
+        The section shares its storage with this spreadsheet whenever both
+        indices are slices.
+
+        :param rows: 0-based row index
+        :param cols: 0-based column index
+        :type rows: slice or array
+        :type cols: slice or array
+        :return: selected cells
+        :rtype: :class:`Spreadsheet`"""
+        section = Spreadsheet(self.assume)
+        section.numbers = self.numbers[rows][:, cols]
+        section.ctypes = self.ctypes[rows][:, cols]
+        section.text = self.text[rows][:, cols]
+        section.strings = self.strings
+        return section
+
+    def section_numbers(self, rows, cols):
+        """Select the numbers of a section of the spreadsheet
+
+        :param rows: 0-based row index
+        :param cols: 0-based column index
+        :type rows: slice or array
+        :type cols: slice or array
+        :return: numbers of the selected cells, NaN for other cells
+        :rtype: array"""
+        return self.numbers[rows][:, cols]
+
     def cell(self, xpos, ypos):
         """Retrieve cell information
 
@@ -307,15 +1747,393 @@ class Spreadsheet(object):
         :type ypos: integer
         :return: cell values and info
         :rtype: :class:`xlrd.sheet.Cell`"""
-        if self.ctypes:
+        if self.ctypes is not None:
+            import xlrd
             return xlrd.sheet.Cell(
-                self.ctypes[xpos][ypos], self.values[xpos][ypos])
-        elif self.assume:
-            return xlrd.sheet.Cell(self.assume, self.values[xpos][ypos])
+                int(self.ctypes[xpos, ypos]), self.value(xpos, ypos))
         else:
             return None
 
 
+class SparseSpreadsheet(Spreadsheet):
+    """Hold mostly empty spreadsheet data
+
+    Only populated cells are stored, in coordinate form sorted by row and
+    column: the position of each cell in the int32 arrays :attr:`row` and
+    :attr:`col`, its type in the int8 array :attr:`cell_ctypes`, its number
+    in the float64 array :attr:`cell_numbers` and its index into
+    :attr:`strings` in the int32 array :attr:`cell_text`. The dense
+    :attr:`numbers`, :attr:`ctypes` and :attr:`text` arrays of
+    :class:`Spreadsheet` are built on first use and kept until the cells are
+    set again."""
+
+    def __init__(self, assumption=None):
+        """Entry point for :class:`SparseSpreadsheet`"""
+        self.shape = None
+        self.row = np.empty(0, dtype=np.int32)
+        self.col = np.empty(0, dtype=np.int32)
+        self.cell_ctypes = np.empty(0, dtype=np.int8)
+        self.cell_numbers = np.empty(0)
+        self.cell_text = np.empty(0, dtype=np.int32)
+        self.strings = []
+        self.assume = assumption
+        self._dense = dict()
+
+    @classmethod
+    def from_dense(cls, sheet):
+        """Keep the populated cells of a :class:`Spreadsheet`
+
+        :param sheet: dense spreadsheet data
+        :type sheet: :class:`Spreadsheet`
+        :return: sparse spreadsheet data
+        :rtype: :class:`SparseSpreadsheet`"""
+        sparse = cls(sheet.assume)
+        populated = sheet.ctypes != EMPTY
+        (row, col) = np.nonzero(populated)
+        sparse.shape = sheet.ctypes.shape
+        sparse.row = row.astype(np.int32)
+        sparse.col = col.astype(np.int32)
+        sparse.cell_ctypes = sheet.ctypes[populated]
+        sparse.cell_numbers = sheet.numbers[populated]
+        sparse.cell_text = sheet.text[populated]
+        sparse.strings = sheet.strings
+        return sparse
+
+    def dense(self):
+        """Convert to a :class:`Spreadsheet`
+
+        :return: dense spreadsheet data
+        :rtype: :class:`Spreadsheet`"""
+        sheet = Spreadsheet(self.assume)
+        sheet._allocate(*self.shape)
+        sheet.numbers[self.row, self.col] = self.cell_numbers
+        sheet.ctypes[self.row, self.col] = self.cell_ctypes
+        sheet.text[self.row, self.col] = self.cell_text
+        sheet.strings = self.strings
+        return sheet
+
+    def set_data(self, data_in):
+        """Set spreadsheet data using cell generators, skipping empty cells"""
+        (nrows, ncols) = (0, 0)
+        cells = []
+        for (xpos, row) in enumerate(data_in):
+            (nrows, ncols) = (xpos + 1, max(ncols, len(row)))
+            cells.extend((xpos, ypos, col) for (ypos, col) in enumerate(row)
+                         if col.ctype != EMPTY)
+
+        self.set_cells(cells, (nrows, ncols))
+
+    def set_cells(self, cells, shape=None):
+        """Set the populated cells of the spreadsheet
+
+        :param cells: 0-based row, column and cell of each populated cell,
+            with the cell holding its ``ctype`` and ``value``
+        :param shape: number of rows and columns, just enough to hold the
+            cells if None
+        :type cells: iterable of tuples
+        :type shape: tuple"""
+        cells = [x for x in cells if x[2].ctype != EMPTY]
+        row = np.array([x[0] for x in cells], dtype=np.int32)
+        col = np.array([x[1] for x in cells], dtype=np.int32)
+        if shape is None:
+            shape = (int(row.max()) + 1 if cells else 0,
+                     int(col.max()) + 1 if cells else 0)
+        if cells and (row.min() < 0 or col.min() < 0 or
+                      row.max() >= shape[0] or col.max() >= shape[1]):
+            raise IndexError('cells outside of shape {}'.format(shape))
+
+        ctypes = [x[2].ctype for x in cells]
+        strings = dict()
+        order = np.lexsort((col, row))
+        self._dense.clear()
+        self.shape = tuple(shape)
+        self.row = row[order]
+        self.col = col[order]
+        self.cell_ctypes = np.array(ctypes, dtype=np.int8)[order]
+        self.cell_numbers = np.array(
+            [x[2].value if ctype in _NUMERIC else np.nan
+             for (ctype, x) in zip(ctypes, cells)], dtype=np.float64)[order]
+        self.cell_text = np.array(
+            [strings.setdefault(x[2].value, len(strings)) if ctype == TEXT
+             else -1 for (ctype, x) in zip(ctypes, cells)],
+            dtype=np.int32)[order]
+        self.strings = sorted(strings, key=strings.get)
+
+    def set_values(self, values):
+        """Set spreadsheet cell values, see :meth:`Spreadsheet.set_values`"""
+        sheet = Spreadsheet(self.assume)
+        sheet.set_values(values)
+        self._replace(SparseSpreadsheet.from_dense(sheet))
+
+    def set_ctypes(self, ctype):
+        """Set spreadsheet cell types, see :meth:`Spreadsheet.set_ctypes`"""
+        sheet = self.dense()
+        sheet.set_ctypes(ctype)
+        self._replace(SparseSpreadsheet.from_dense(sheet))
+
+    def _replace(self, other):
+        """Take over the storage of another sparse spreadsheet"""
+        self._dense.clear()
+        for name in ('shape', 'row', 'col', 'cell_ctypes', 'cell_numbers',
+                     'cell_text', 'strings'):
+            setattr(self, name, getattr(other, name))
+
+    def _dense_array(self, values, fill):
+        """Dense array of one cell attribute, built on first use
+
+        :param values: name of the attribute holding the populated cells
+        :param fill: value of the empty cells
+        :type values: string
+        :type fill: number
+        :return: (row x column) values, None if the sheet is not set
+        :rtype: array"""
+        if self.shape is None:
+            return None
+
+        array = self._dense.get(values)
+        if array is None:
+            cells = getattr(self, values)
+            array = np.full(self.shape, fill, dtype=cells.dtype)
+            array[self.row, self.col] = cells
+            array = self._dense.setdefault(values, array)
+        return array
+
+    @property
+    def numbers(self):
+        """Dense numeric cell values"""
+        return self._dense_array('cell_numbers', np.nan)
+
+    @property
+    def ctypes(self):
+        """Dense cell types"""
+        return self._dense_array('cell_ctypes', EMPTY)
+
+    @property
+    def text(self):
+        """Dense text cell indices"""
+        return self._dense_array('cell_text', -1)
+
+    def size(self):
+        """Retrieve the dimensions of the spreadsheet
+
+        :return: spreadsheed dimensions
+        :rtype: tuple"""
+        return self.shape
+
+    def density(self):
+        """Retrieve the fraction of populated cells
+
+        :return: populated cells over all cells
+        :rtype: float"""
+        cells = self.shape[0]*self.shape[1] if self.shape else 0
+        return len(self.row)/float(cells) if cells else 0.0
+
+    def _find(self, xpos, ypos):
+        """Position of a cell in the coordinate arrays, None if empty"""
+        (nrows, ncols) = self.shape
+        (xpos, ypos) = (xpos + nrows if xpos < 0 else xpos,
+                        ypos + ncols if ypos < 0 else ypos)
+        if not (0 <= xpos < nrows and 0 <= ypos < ncols):
+            raise IndexError('cell out of range: ({}, {})'.format(xpos, ypos))
+
+        start = np.searchsorted(self.row, xpos)
+        stop = np.searchsorted(self.row, xpos, 'right')
+        pos = start + np.searchsorted(self.col[start:stop], ypos)
+        if pos < stop and self.col[pos] == ypos:
+            return pos
+        return None
+
+    def value(self, xpos, ypos):
+        """Retrieve a cell value
+
+        :param xpos: cell row
+        :param ypos: cell column
+        :type xpos: integer
+        :type ypos: integer
+        :return: cell value
+        :rtype: float, integer or string"""
+        pos = self._find(xpos, ypos)
+        if pos is None:
+            return ''
+
+        ctype = self.cell_ctypes[pos]
+        if ctype == TEXT:
+            return self.strings[self.cell_text[pos]]
+        elif ctype in (BOOLEAN, ERROR):
+            return int(self.cell_numbers[pos])
+        elif ctype in _NUMERIC:
+            return float(self.cell_numbers[pos])
+        else:
+            return ''
+
+    def ravel(self):
+        """Retrieve all cell values in row-major order
+
+        :return: cell values
+        :rtype: list"""
+        strings = self.strings
+        cells = np.full(self.shape[0]*self.shape[1], '', dtype=object)
+        cells[self.row.astype(np.intp)*self.shape[1] + self.col] = [
+            strings[text] if ctype == TEXT else
+            int(number) if ctype in (BOOLEAN, ERROR) else
+            number if ctype in _NUMERIC else ''
+            for (ctype, number, text) in zip(
+                self.cell_ctypes.tolist(), self.cell_numbers.tolist(),
+                self.cell_text.tolist())]
+        return cells.tolist()
+
+    def section(self, rows, cols):
+        """Select a section of the spreadsheet
+
+        :param rows: 0-based row index
+        :param cols: 0-based column index
+        :type rows: slice or array
+        :type cols: slice or array
+        :return: selected cells
+        :rtype: :class:`SparseSpreadsheet`"""
+        if isinstance(rows, slice) and rows.step in (None, 1):
+            # the entries of contiguous rows are contiguous too
+            (first, last, _) = rows.indices(self.shape[0])
+            last = max(first, last)
+            (start, stop) = np.searchsorted(self.row, [first, last])
+            entries = np.arange(start, stop)
+            row = self.row[start:stop] - first
+            rows = np.arange(first, last)
+        else:
+            rows = np.arange(self.shape[0])[rows]
+            (entries, row) = _coo_select(self.row, rows)
+
+        cols = np.arange(self.shape[1])[cols]
+        (found, col) = _coo_select(self.col[entries], cols)
+        (entries, row) = (entries[found], row[found])
+        order = np.lexsort((col, row))
+        entries = entries[order]
+
+        section = SparseSpreadsheet(self.assume)
+        section.shape = (len(rows), len(cols))
+        section.row = row[order].astype(np.int32)
+        section.col = col[order].astype(np.int32)
+        section.cell_ctypes = self.cell_ctypes[entries]
+        section.cell_numbers = self.cell_numbers[entries]
+        section.cell_text = self.cell_text[entries]
+        section.strings = self.strings
+        return section
+
+    def section_numbers(self, rows, cols):
+        """Select the numbers of a section of the spreadsheet
+
+        :param rows: 0-based row index
+        :param cols: 0-based column index
+        :type rows: slice or array
+        :type cols: slice or array
+        :return: numbers of the selected cells, NaN for other cells
+        :rtype: array"""
+        section = self.section(rows, cols)
+        numbers = np.full(section.shape, np.nan)
+        numbers[section.row, section.col] = section.cell_numbers
+        return numbers
+
+    def cell(self, xpos, ypos):
+        """Retrieve cell information
+
+        :param xpos: cell row
+        :param ypos: cell column
+        :type xpos: integer
+        :type ypos: integer
+        :return: cell values and info
+        :rtype: :class:`xlrd.sheet.Cell`"""
+        if self.shape is None:
+            return None
+
+        import xlrd
+        pos = self._find(xpos, ypos)
+        ctype = EMPTY if pos is None else int(self.cell_ctypes[pos])
+        return xlrd.sheet.Cell(ctype, self.value(xpos, ypos))
+
+
+def _coo_select(coords, index):
+    """Select coordinate entries by an index of rows or columns
+
+    :param coords: row or column of each entry
+    :param index: selected rows or columns, possibly repeated
+    :type coords: array
+    :type index: array
+    :return: selected entries and their position in the selection, an entry
+        appearing once for each time its row or column is selected
+    :rtype: tuple of arrays"""
+    order = np.argsort(index, kind='mergesort')
+    ordered = index[order]
+    first = np.searchsorted(ordered, coords)
+    counts = np.searchsorted(ordered, coords, 'right') - first
+    entries = np.repeat(np.arange(len(coords)), counts)
+    offsets = np.arange(len(entries)) - np.repeat(np.cumsum(counts) - counts,
+                                                  counts)
+    return (entries, order[np.repeat(first, counts) + offsets])
+
+
+class Dataset(object):
+    """COMSOL variables stored one uncompressed .npy file per variable
+
+    Behaves like the mapping returned by :func:`load` for a .npz archive, and
+    additionally provides the stored frame offsets of each variable."""
+
+    def __init__(self, path, mmap_mode='r'):
+        """Entry point for :class:`Dataset`
+
+        :param path: dataset directory
+        :param mmap_mode: memory-map mode of the variables
+        :type path: string
+        :type mmap_mode: string or None"""
+        self.path = path
+        self.mmap_mode = mmap_mode
+        self._arrays = dict()
+        self._starts = dict()
+        metadata = np.load(os.path.join(path, DATASET_METADATA))
+        try:
+            for name in metadata.files:
+                if name.endswith(_FRAMES):
+                    self._starts[name[:-len(_FRAMES)]] = metadata[name]
+                else:
+                    self._arrays[name] = metadata[name]
+        finally:
+            metadata.close()
+
+        self._names = sorted(
+            [x[:-4] for x in os.listdir(path) if x.endswith('.npy')] +
+            list(self._arrays))
+
+    def __getitem__(self, name):
+        if name not in self._arrays:
+            if name not in self._names:
+                raise KeyError(name)
+            self._arrays[name] = np.load(
+                os.path.join(self.path, name + '.npy'), self.mmap_mode)
+
+        return self._arrays[name]
+
+    def __contains__(self, name):
+        return name in self._names
+
+    def __iter__(self):
+        return iter(self._names)
+
+    def __len__(self):
+        return len(self._names)
+
+    def keys(self):
+        """Names of the mesh and variables"""
+        return list(self._names)
+
+    def frame_starts(self, name):
+        """Retrieve the stored frame offsets of a variable
+
+        :param name: variable name
+        :type name: string
+        :return: row offsets of the frames, None if not a COMSOL export
+        :rtype: array or None"""
+        return self._starts.get(name)
+
+
 def main():
     """Module entry point"""
     pass
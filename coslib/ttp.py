@@ -1,44 +1,304 @@
 """Standard modules"""
 import sys
+import itertools
+from multiprocessing.pool import ThreadPool
 import numpy as np
-import ldp
-import matplotlib.pyplot as plt
+
+try:
+    from coslib import ldp
+    from coslib import execution
+    from coslib import instrument
+except ImportError:
+    import ldp
+    import execution
+    import instrument
+
+# variables of :class:`SimData` in block order
+SIM_VARIABLES = ('ce', 'cse', 'phie', 'phis', 'j')
+
+# names of the domains of a three-domain cell
+DOMAINS = ('neg', 'sep', 'pos')
+
+FARADAY = 96487
+GAS_CONSTANT = 8.314
+
+# fields of the error tables returned by validate and validate_flux, the
+# text fields are widened for longer variable and domain names
+VALIDATION_DTYPE = np.dtype([
+    ('variable', 'U8'), ('domain', 'U8'), ('step', np.int64),
+    ('time', np.float64), ('rms', np.float64), ('max_abs', np.float64),
+    ('relative', np.float64)])
+
+# rows of the parameter blocks of the gold standard workbook
+PARAMETER_LAYOUT = {
+    'const': range(7, 15),
+    'neg': range(18, 43),
+    'sep': range(47, 52),
+    'pos': range(55, 75)
+}
+
+# rows of each frame repeating an interface node, per COMSOL variable
+COMSOL_DELETE = {
+    'cse': [80, 202],
+    'phis': [80, 202],
+    'j': [80, 202]
+}
 
 
 class SimMesh(object):
-    def __init__(self, mesh, neg, sep, pos):
+    """Mesh nodes partitioned into domains
+
+    The node indices, boolean masks and slices of each domain are computed
+    once. A three-domain mesh names its domains ``neg``, ``sep`` and ``pos``,
+    other meshes ``domain0``, ``domain1``, etc."""
+
+    def __init__(self, mesh, *domains):
+        """Entry point for :class:`SimMesh`
+
+        :param mesh: node locations
+        :param domains: node indices of each domain
+        :type mesh: array
+        :type domains: arrays"""
         self.mesh = mesh
-        self.neg = neg
-        self.pos = pos
-        self.sep = sep
+        self.domains = [np.asarray(x, dtype=np.intp) for x in domains]
+        if len(domains) == len(DOMAINS):
+            self.names = DOMAINS
+        else:
+            self.names = tuple('domain{}'.format(x)
+                               for x in range(len(domains)))
+
+        self.masks = []
+        self.slices = []
+        for (name, index) in zip(self.names, self.domains):
+            setattr(self, name, index)
+            mask = np.zeros(len(mesh), dtype=bool)
+            mask[index] = True
+            self.masks.append(mask)
+            self.slices.append(_contiguous(index))
+
+    def domain(self, name):
+        """Retrieve the number of a domain
+
+        :param name: domain name or number
+        :type name: string or integer
+        :return: domain number
+        :rtype: integer"""
+        return name if isinstance(name, int) else self.names.index(name)
+
+    def mask(self, name):
+        """Retrieve the boolean node mask of a domain
+
+        :param name: domain name or number
+        :type name: string or integer
+        :return: True for the nodes of the domain
+        :rtype: array"""
+        return self.masks[self.domain(name)]
+
+    def index(self, name):
+        """Retrieve the node index of a domain, as a slice if contiguous
+
+        :param name: domain name or number
+        :type name: string or integer
+        :return: node index
+        :rtype: slice or array"""
+        number = self.domain(name)
+        if self.slices[number] is not None:
+            return self.slices[number]
+
+        return self.domains[number]
+
+
+def _contiguous(index):
+    """Convert an index array of consecutive integers to a slice
+
+    :param index: integer index
+    :type index: array
+    :return: equivalent slice, None if the index is not consecutive
+    :rtype: slice or None"""
+    index = np.asarray(index)
+    if index.ndim != 1 or not np.issubdtype(index.dtype, np.integer):
+        return None
+
+    if not len(index):
+        return slice(0, 0)
+
+    if index[0] >= 0 and np.all(np.diff(index) == 1):
+        return slice(int(index[0]), int(index[-1]) + 1)
+
+    return None
 
 
 class SimData(object):
+    """Simulation variables held in one (variable x time x location) block
+
+    The ce, cse, phie, phis and j attributes are views of :attr:`block`, and
+    selections by slices or contiguous index arrays return views as well."""
+
+    __slots__ = ('block',)
+
     def __init__(self, ce, cse, phie, phis, j):
-        self.ce = ce
-        self.cse = cse
-        self.phie = phie
-        self.phis = phis
-        self.j = j
+        self.block = np.array([ce, cse, phie, phis, j], dtype='float')
+
+    @classmethod
+    def from_block(cls, block):
+        """Wrap a (variable x time x location) block without copying it
+
+        :param block: variables in the order of :data:`SIM_VARIABLES`
+        :type block: array
+        :return: simulation data
+        :rtype: :class:`SimData`"""
+        sim_data = cls.__new__(cls)
+        sim_data.block = block
+        return sim_data
+
+    ce = property(lambda self: self.block[0])
+    cse = property(lambda self: self.block[1])
+    phie = property(lambda self: self.block[2])
+    phis = property(lambda self: self.block[3])
+    j = property(lambda self: self.block[4])
 
     def get_sim_data(self, time_index, location):
-        return SimData(
-                self.ce[time_index, location], self.cse[time_index, location],
-                self.phie[time_index, location], self.phis[time_index, location],
-                self.j[time_index, location])
-
+        return SimData.from_block(
+            self.block[:, _as_index(time_index), _as_index(location)])
+
+
+def _as_index(index):
+    """Use a slice in place of an index of consecutive integers"""
+    if isinstance(index, (list, np.ndarray)):
+        contiguous = _contiguous(index)
+        if contiguous is not None:
+            return contiguous
+
+    return index
+
+
+class FrameIndex(object):
+    """Frame offsets and time axis of a COMSOL parameter series
+
+    COMSOL exports every time step of a variable as a single two-column
+    array of location and value, a new frame starts wherever the location
+    decreases. The offsets are found once so that the frame of any time can
+    be sliced out directly."""
+
+    def __init__(self, parameter, delta_t=0.1, start=None):
+        """Entry point for :class:`FrameIndex`
+
+        :param parameter: location and value columns of all frames
+        :param delta_t: time between frames
+        :param start: precomputed offsets of the first row of each frame
+        :type parameter: array
+        :type delta_t: float
+        :type start: array or None"""
+        self.parameter = parameter
+        self.delta_t = delta_t
+        if start is None:
+            start = ldp.frame_starts(parameter[:, 0])
+
+        self.start = np.asarray(start)
+        self.stop = np.append(self.start[1:], len(parameter))
+        self.time = np.arange(0, len(self.start))*delta_t
+
+    def __len__(self):
+        return len(self.start)
+
+    @classmethod
+    def from_data(cls, data, name, delta_t=0.1):
+        """Build the frame index of a variable, reusing stored offsets
+
+        :param data: COMSOL variables, e.g. a :class:`ldp.Dataset`
+        :param name: variable name
+        :param delta_t: time between frames
+        :type data: mapping of names to arrays
+        :type name: string
+        :type delta_t: float
+        :return: frame index
+        :rtype: :class:`FrameIndex`"""
+        start = None
+        if hasattr(data, 'frame_starts'):
+            start = data.frame_starts(name)
+
+        return cls(data[name], delta_t, start)
+
+    def index(self, time):
+        """Find the frame recorded at the given time
+
+        :param time: time of the frame
+        :type time: float
+        :return: frame number
+        :rtype: integer"""
+        return int(self.indices([time])[0])
+
+    def indices(self, times):
+        """Find the frames recorded at the given times
+
+        :param times: times of the frames
+        :type times: list of floats
+        :return: frame numbers
+        :rtype: array"""
+        times = np.asarray(times, dtype='float')
+        index = np.rint(times/self.delta_t).astype(np.intp)
+        valid = (index >= 0) & (index < len(self))
+        valid[valid] = np.isclose(self.time[index[valid]], times[valid])
+        if not np.all(valid):
+            raise ValueError('No frame at time {}'.format(times[~valid][0]))
+
+        return index
+
+    def frame(self, time):
+        """Slice the location and value columns of the frame at a time
+
+        :param time: time of the frame
+        :type time: float
+        :return: view of the frame rows
+        :rtype: array"""
+        index = self.index(time)
+        return self.parameter[self.start[index]:self.stop[index]]
+
+    def take(self, times, delete=None, out=None):
+        """Gather the values of several frames into a (time x location) array
+
+        All frames are read with a single fancy index into the value column.
+
+        :param times: times of the frames
+        :param delete: frame rows to drop
+        :param out: array to fill
+        :type times: list of floats
+        :type delete: list of integers or None
+        :type out: array or None
+        :return: frame values
+        :rtype: array"""
+        index = self.indices(times)
+        if not len(index):
+            return np.empty((0, 0)) if out is None else out
+
+        width = np.unique(self.stop[index] - self.start[index])
+        if len(width) > 1:
+            raise ValueError('Frames differ in length: {}'.format(width))
+
+        columns = np.arange(width[0])
+        if delete:
+            columns = np.delete(columns, delete)
+
+        rows = self.start[index][:, np.newaxis] + columns
+        if out is None:
+            out = np.empty(rows.shape)
+
+        return np.take(self.parameter[:, 1], rows, out=out)
+
+
+@instrument.instrumented
 def get_var(parameter, time, location=None, delta_t=0.1, delete=None):
-    """Fetch parameter data from a given location and time"""
-    (x_parameter, y_parameter) = (parameter[:, 0], parameter[:, 1])
-    time_frame = np.nonzero(np.diff(x_parameter) < 0)[0]
-    start = np.insert(time_frame+1, 0, 0)
-    stop = np.append(time_frame, len(x_parameter))
-    time_range = np.arange(0, len(start))*delta_t
-    time_index = np.nonzero(time_range == time)[0][0]
-    data = y_parameter[start[time_index]:stop[time_index]+1]
-    if location:
-        data = data[
-            location == x_parameter[start[time_index]:stop[time_index]]]
+    """Fetch parameter data from a given location and time
+
+    Pass a :class:`FrameIndex` as ``parameter`` to avoid searching the frame
+    offsets on every call."""
+    if not isinstance(parameter, FrameIndex):
+        parameter = FrameIndex(parameter, delta_t)
+
+    frame = parameter.frame(time)
+    data = frame[:, 1]
+    if location is not None:
+        data = data[location == frame[:, 0]]
 
     if delete:
         data = np.delete(data, delete)
@@ -51,6 +311,7 @@ def nice_abs(number):
     return ((np.sign(number)+1)/2)*np.abs(number)
 
 
+@instrument.instrumented
 def reaction_flux(sim_data, params, const):
     """J"""
 
@@ -63,69 +324,503 @@ def reaction_flux(sim_data, params, const):
     soc = sim_data.cse/params['csmax']
     # eta = phis-phie-params['eref'](soc)
     eta = sim_data.phis-sim_data.phie-params['Uocp'][0](soc)
-    F = 96487
-    R = 8.314
+    RT = GAS_CONSTANT*const['Tref']
     return np.array([reaction_flux0*(
-        np.exp((1-params['alpha'])*F*eta/(R*const['Tref'])) -
-        np.exp(-params['alpha']*F*eta/(R*const['Tref'])))])
-
-
-def region(mesh):
-    """Find the regions in the mesh"""
-    xneg = np.nonzero(mesh <= 1)[0]
-    xpos = np.nonzero(mesh > 2)[0]
-    xsep = np.nonzero((mesh > 1) & (mesh <= 2))[0]
-
-    if mesh[xneg[-1]] == mesh[xneg[-2]]:
-        xsep = np.concatenate((1, xneg[-1], xsep))
-        xneg = np.delete(xneg, -1)
-
-    if mesh[xsep[-1]] == mesh[xsep[-2]]:
-        xpos = np.concatenate((1, xsep[-1], xpos))
-        xsep = np.delete(xsep, -1)
-
-    return SimMesh(mesh, xneg, xsep, xpos)
-
-
-def assemble_comsol(time, data, space=None, dt=0.1):
-    ce, cse, phie, phis, j = (np.empty((0, len(data['mesh']))) for i in range(5))
-    for ind in time:
-        ce = np.append(ce, get_var(data['ce'], ind), axis=0)
-        cse = np.append(cse, get_var(data['cse'], ind, delete=[80, 202]), axis=0)
-        phie = np.append(phie, get_var(data['phie'], ind), axis=0)
-        phis = np.append(phis, get_var(data['phis'], ind, delete=[80, 202]), axis=0)
-        j = np.append(j, get_var(data['j'], ind, delete=[80, 202]), axis=0)
-
-    return SimData(ce, cse, phie, phis, j)
-
-
-def plot_j(time, data, mesh, params):
-    jneg = np.empty((0, len(mesh.neg)))
-    jpos = np.empty((0, len(mesh.pos)))
-
-    for ind in range(0,len(time)):
-        jneg = np.append(jneg, reaction_flux(data.get_sim_data(ind, mesh.neg), params['neg'], params['const']), axis=0)
-        jpos = np.append(jpos, reaction_flux(data.get_sim_data(ind, mesh.pos), params['pos'], params['const']), axis=0)
-        plt.plot(mesh.neg, jneg[ind,:], mesh.pos, jpos[ind,:])
-
-    print('Neg rms: {}'.format(np.sqrt(np.mean(np.square(jneg-data.get_sim_data(slice(0,len(time)), mesh.neg).j), axis=1))))
-    print('Pos rms: {}'.format(np.sqrt(np.mean(np.square(jpos-data.get_sim_data(slice(0,len(time)), mesh.pos).j), axis=1))))
-    plt.grid()
-    plt.ticklabel_format(style='sci', axis='y', scilimits=(0,0))
+        np.exp((1-params['alpha'])*FARADAY*eta/RT) -
+        np.exp(-params['alpha']*FARADAY*eta/RT))])
+
+
+@instrument.instrumented
+def reaction_flux_batch(sim_data, params, const):
+    """Compute the reaction flux of every time step and location at once
+
+    Evaluates the same Butler-Volmer expression as :func:`reaction_flux`
+    with its arithmetic fused into numexpr kernels writing to reused arrays,
+    while the powers and exponentials run on numpy's vectorized ufuncs.
+
+    :param sim_data: (time x location) data of one electrode
+    :param params: electrode parameters
+    :param const: cell constants
+    :type sim_data: :class:`SimData`
+    :type params: dict
+    :type const: dict
+    :return: (time x location) reaction flux
+    :rtype: array"""
+    import numexpr as ne
+    alpha = params['alpha']
+    soc = sim_data.cse/params['csmax']
+    eta = np.asarray(params['Uocp'][0](soc), dtype=np.float64)
+    if eta is soc or eta.shape != soc.shape:
+        eta = np.array(np.broadcast_to(eta, soc.shape))
+    arrays = {'phis': sim_data.phis, 'phie': sim_data.phie, 'eta': eta,
+              'soc': soc, 'ce': sim_data.ce, 'ce0': const['ce0'],
+              'f': FARADAY/(GAS_CONSTANT*const['Tref'])}
+
+    # the scaled overpotential replaces the open circuit potential, and
+    # where(x > 0, x, 0) is nice_abs
+    ne.evaluate('f*(phis - phie - eta)', local_dict=arrays, out=eta)
+    flux = ne.evaluate('where(1 - soc > 0, 1 - soc, 0)'
+                       '*where(ce > 0, ce/ce0, 0)', local_dict=arrays)
+    ne.evaluate('where(soc > 0, soc, 0)', local_dict=arrays, out=soc)
+    # overflow gives inf as it does in numexpr
+    with np.errstate(over='ignore'):
+        np.power(flux, 1 - alpha, out=flux)
+        np.power(soc, alpha, out=soc)
+        cathodic = np.multiply(eta, -alpha)
+        np.exp(cathodic, out=cathodic)
+        np.multiply(eta, 1 - alpha, out=eta)
+        np.exp(eta, out=eta)
+
+    arrays.update(k=params['k_norm_ref'], flux=flux, cathodic=cathodic)
+    return ne.evaluate('k*flux*soc*(eta - cathodic)', local_dict=arrays,
+                       out=flux)
+
+
+def _flux_shard(job):
+    """Compute the reaction flux of one shard of :func:`electrode_flux`"""
+    (sim_data, params, const) = job
+    return reaction_flux_batch(sim_data, params, const)
+
+
+@instrument.instrumented
+def electrode_flux(data, mesh, params, electrodes=('neg', 'pos')):
+    """Compute the reaction flux of each electrode over all time steps
+
+    The electrodes are computed as set by :data:`execution.config`, one
+    after the other or sharded over a pool of threads or processes. Each
+    electrode is split into blocks of time steps when the pool has more
+    workers than there are electrodes. Data too small to be worth a pool is
+    computed in this thread, see :func:`execution.pool_map`.
+
+    :param data: (time x location) simulation data
+    :param mesh: mesh regions
+    :param params: parameters of the cell constants and electrodes
+    :param electrodes: names of the electrodes
+    :type data: :class:`SimData`
+    :type mesh: :class:`SimMesh`
+    :type params: dict
+    :type electrodes: tuple of strings
+    :return: mapping of electrode names to (time x location) flux
+    :rtype: dict"""
+    size = execution.config.pool_size(len(electrodes)*data.block.shape[1])
+    steps = execution.shards(data.block.shape[1], -(-size//len(electrodes)))
+    jobs = [(data.get_sim_data(step, mesh.index(name)), params[name],
+             params['const']) for name in electrodes for step in steps]
+    results = execution.pool_map(_flux_shard, jobs, data.block[0].size)
+    return dict((name, np.concatenate(
+        results[k*len(steps):(k+1)*len(steps)]))
+        for (k, name) in enumerate(electrodes))
+
+
+@instrument.instrumented
+def region(mesh, boundaries=(1, 2)):
+    """Find the regions in the mesh
+
+    Nodes are assigned to domains split at the given boundaries, a node on a
+    boundary belongs to the domain below it. If an interface node is
+    repeated, the repeated node starts the domain above.
+
+    :param mesh: node locations
+    :param boundaries: increasing domain boundaries
+    :type mesh: array
+    :type boundaries: list of floats
+    :return: mesh domains
+    :rtype: :class:`SimMesh`"""
+    mesh = np.asarray(mesh)
+    boundaries = np.asarray(boundaries, dtype='float')
+    domain = np.searchsorted(boundaries, mesh, side='left')
+
+    # without boundaries there are no interfaces to move repeated nodes past
+    if len(boundaries):
+        repeated = np.nonzero(np.diff(mesh) == 0)[0] + 1
+        on_boundary = boundaries[
+            np.minimum(domain[repeated], len(boundaries)-1)]
+        domain[repeated[mesh[repeated] == on_boundary]] += 1
+
+    # stable sort keeps the nodes of each domain in mesh order
+    order = np.argsort(domain, kind='mergesort')
+    edges = np.searchsorted(domain[order], np.arange(len(boundaries)+2))
+    return SimMesh(mesh, *[order[edges[x]:edges[x+1]]
+                           for x in range(len(boundaries)+1)])
+
+
+@instrument.instrumented
+def assemble_comsol(time, data, space=None, dt=0.1, workers=None):
+    """Assemble the COMSOL variables at the given times into :class:`SimData`
+
+    Each variable is gathered straight into a preallocated
+    (time x location) array.
+
+    :param time: times to assemble
+    :param data: COMSOL variables and mesh
+    :param dt: time between frames
+    :param workers: number of threads assembling variables in parallel
+    :type time: list of floats
+    :type data: mapping of names to arrays
+    :type dt: float
+    :type workers: integer or None
+    :return: assembled variables
+    :rtype: :class:`SimData`"""
+    names = SIM_VARIABLES
+    assembled = np.empty((len(names), len(time), len(data['mesh'])))
+
+    def assemble(ind):
+        frames = FrameIndex.from_data(data, names[ind], dt)
+        frames.take(time, COMSOL_DELETE.get(names[ind]), out=assembled[ind])
+
+    if workers:
+        pool = ThreadPool(workers)
+        try:
+            pool.map(assemble, range(len(names)))
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        for ind in range(len(names)):
+            assemble(ind)
+
+    return SimData.from_block(assembled)
+
+
+def iter_frames(filename, delta_t=0.1, chunk=65536, comments='%',
+                delimiter=','):
+    """Read a COMSOL csv export one frame at a time
+
+    The export is parsed in chunks of lines and split into frames wherever
+    the location decreases, so memory use is bounded by the chunk and frame
+    sizes rather than the size of the export.
+
+    :param filename: name of the two-column csv export
+    :param delta_t: time between frames
+    :param chunk: number of lines to parse at once
+    :param comments: prefix of header lines
+    :param delimiter: column delimiter
+    :type filename: string
+    :type delta_t: float
+    :type chunk: integer
+    :type comments: string
+    :type delimiter: string
+    :return: time and location and value columns of each frame
+    :rtype: iterator of tuples"""
+    pending = np.empty((0, 2))
+    count = 0
+    with open(filename) as export:
+        while True:
+            lines = list(itertools.islice(export, chunk))
+            if not lines:
+                break
+
+            lines = [x for x in lines if x.strip() and
+                     not x.startswith(comments)]
+            if not lines:
+                continue
+
+            data = np.concatenate((pending, np.loadtxt(
+                lines, delimiter=delimiter, ndmin=2)[:, :2]))
+            start = ldp.frame_starts(data[:, 0])
+            for (first, last) in zip(start[:-1], start[1:]):
+                yield (count*delta_t, data[first:last])
+                count += 1
+
+            pending = data[start[-1]:]
+
+    if len(pending):
+        yield (count*delta_t, pending)
+
+
+def stream_comsol(exports, stages=(), delta_t=0.1, chunk=65536):
+    """Stream COMSOL csv exports frame by frame through processing stages
+
+    The frames of every variable at one time step are combined into a
+    single time step :class:`SimData`, which is passed through each stage in
+    turn. Only a few frames are held in memory at once.
+
+    :example:
+
+    mesh = region(np.loadtxt('mesh.csv'))
+    stages = [lambda data: electrode_flux(data, mesh, params)]
+    results = stream_comsol({'ce': 'ce.csv', 'cse': 'cse.csv', ...}, stages)
+    write_stream(results, 'flux.csv')
+
+    :param exports: csv export of each of :data:`SIM_VARIABLES`
+    :param stages: functions applied in turn, starting from the frame data
+    :param delta_t: time between frames
+    :param chunk: number of lines to parse at once
+    :type exports: dict
+    :type stages: list of callables
+    :type delta_t: float
+    :type chunk: integer
+    :return: time and result of the last stage for each time step
+    :rtype: iterator of tuples"""
+    streams = [iter_frames(exports[name], delta_t, chunk)
+               for name in SIM_VARIABLES]
+    for frames in zip(*streams):
+        block = [np.delete(frame[:, 1], COMSOL_DELETE.get(name, []))
+                 for (name, (_, frame)) in zip(SIM_VARIABLES, frames)]
+        widths = set(len(x) for x in block)
+        if len(widths) > 1:
+            raise ValueError('Frames differ in length: {}'.format(widths))
+
+        result = SimData.from_block(np.array(block)[:, np.newaxis, :])
+        for stage in stages:
+            result = stage(result)
+
+        yield (frames[0][0], result)
+
+
+def write_stream(results, filename, delimiter=','):
+    """Write streamed results to a csv file as they arrive
+
+    Each array result is written as one row starting with its time. A result
+    mapping names to arrays is written as one row per name, starting with
+    the time and the name.
+
+    :param results: time and result of each time step
+    :param filename: name of the file to write
+    :param delimiter: column delimiter
+    :type results: iterator of tuples
+    :type filename: string
+    :type delimiter: string
+    :return: number of time steps written
+    :rtype: integer"""
+    count = 0
+    with open(filename, 'w') as out:
+        for (time, result) in results:
+            if isinstance(result, SimData):
+                result = result.block
+
+            items = sorted(result.items()) if isinstance(result, dict) else \
+                [(None, result)]
+            for (name, value) in items:
+                prefix = [repr(time)] + ([] if name is None else [str(name)])
+                out.write(delimiter.join(prefix + [
+                    repr(x) for x in np.ravel(value).tolist()]) + '\n')
+            count += 1
+
+    return count
+
+
+def _validation_dtype(names):
+    """:data:`VALIDATION_DTYPE` with text fields wide enough for the names"""
+    width = max([VALIDATION_DTYPE['variable'].itemsize//4] +
+                [len(x) for x in names])
+    return np.dtype([
+        (name, 'U{}'.format(width) if VALIDATION_DTYPE[name].kind == 'U'
+         else VALIDATION_DTYPE[name]) for name in VALIDATION_DTYPE.names])
+
+
+def _errors(variables, domain, time, diff, reference, dtype=VALIDATION_DTYPE):
+    """Error table of (variable x time x location) differences
+
+    :param variables: names of the variables
+    :param domain: name of the domain
+    :param time: time of each step
+    :param diff: computed minus reference values
+    :param reference: reference values
+    :param dtype: fields of the table, see :func:`_validation_dtype`
+    :return: one row per variable and time step
+    :rtype: structured array of :data:`VALIDATION_DTYPE`"""
+    (nvars, nsteps) = diff.shape[:2]
+    table = np.zeros((nvars, nsteps), dtype)
+    table['variable'] = np.array(variables)[:, np.newaxis]
+    table['domain'] = domain
+    table['step'] = np.arange(nsteps)
+    table['time'] = time
+    table['rms'] = np.sqrt(np.mean(np.square(diff), axis=-1))
+    table['max_abs'] = np.max(np.abs(diff), axis=-1)
+    scale = np.sqrt(np.mean(np.square(reference), axis=-1))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        table['relative'] = np.where(scale > 0, table['rms']/scale, np.nan)
+
+    return table.ravel()
+
+
+def _steps(time, nsteps):
+    """Time of each step, the step numbers when no times are given"""
+    if time is None:
+        return np.arange(nsteps, dtype=np.float64)
+    return np.asarray(time, dtype=np.float64)
+
+
+@instrument.instrumented
+def validate(computed, reference, mesh, time=None, variables=SIM_VARIABLES,
+             domains=DOMAINS):
+    """Compare simulation data with reference data in one batched call
+
+    :param computed: (time x location) simulation data
+    :param reference: (time x location) reference data, e.g. from COMSOL
+    :param mesh: mesh regions
+    :param time: time of each step
+    :param variables: names of the variables to compare
+    :param domains: names of the domains to compare
+    :type computed: :class:`SimData`
+    :type reference: :class:`SimData`
+    :type mesh: :class:`SimMesh`
+    :type time: list of floats
+    :type variables: tuple of strings
+    :type domains: tuple of strings
+    :return: rms, maximum absolute and relative rms error of each variable,
+        domain and time step
+    :rtype: structured array of :data:`VALIDATION_DTYPE`"""
+    rows = [SIM_VARIABLES.index(x) for x in variables]
+    diff = computed.block[rows] - reference.block[rows]
+    values = reference.block[rows]
+    time = _steps(time, diff.shape[1])
+    dtype = _validation_dtype(tuple(variables) + tuple(domains))
+    return np.concatenate([
+        _errors(variables, name, time, diff[:, :, mesh.index(name)],
+                values[:, :, mesh.index(name)], dtype) for name in domains])
+
+
+@instrument.instrumented
+def validate_flux(data, mesh, params, time=None, electrodes=('neg', 'pos'),
+                  flux=None):
+    """Compare the computed reaction flux of each electrode with the flux of
+    the simulation data
+
+    :param data: (time x location) simulation data
+    :param mesh: mesh regions
+    :param params: parameters of the cell constants and electrodes
+    :param time: time of each step
+    :param electrodes: names of the electrodes
+    :param flux: flux from :func:`electrode_flux`, computed if not given
+    :type data: :class:`SimData`
+    :type mesh: :class:`SimMesh`
+    :type params: dict
+    :type time: list of floats
+    :type electrodes: tuple of strings
+    :type flux: dict
+    :return: rms, maximum absolute and relative rms error of each electrode
+        and time step
+    :rtype: structured array of :data:`VALIDATION_DTYPE`"""
+    if flux is None:
+        flux = electrode_flux(data, mesh, params, electrodes)
+
+    (tables, dtype) = ([], _validation_dtype(electrodes))
+    for name in electrodes:
+        reference = data.get_sim_data(slice(None), mesh.index(name)).j
+        tables.append(_errors(
+            ('j',), name, _steps(time, len(reference)),
+            (flux[name] - reference)[np.newaxis], reference[np.newaxis],
+            dtype))
+
+    return np.concatenate(tables)
+
+
+def validation_records(table):
+    """Convert an error table to JSON serializable records
+
+    :param table: error table from :func:`validate` or :func:`validate_flux`
+    :type table: structured array
+    :return: one dict per row, with None for undefined errors
+    :rtype: list of dicts"""
+    return [dict((name, None if value != value else value)
+                 for (name, value) in zip(table.dtype.names, row))
+            for row in table.tolist()]
+
+
+def _draw_flux(axes, mesh, flux):
+    """Draw the flux of all time steps of each electrode as one collection
+
+    :param axes: axes to draw on
+    :param mesh: node indices of each electrode
+    :param flux: (time x location) flux of each electrode
+    :type axes: :class:`matplotlib.axes.Axes`
+    :type mesh: dict
+    :type flux: dict"""
+    from matplotlib.collections import LineCollection
+    for (color, name) in enumerate(sorted(flux)):
+        values = np.atleast_2d(flux[name])
+        location = np.broadcast_to(mesh[name], values.shape)
+        axes.add_collection(LineCollection(
+            np.stack((location, values), axis=-1), colors='C{}'.format(color),
+            label=name))
+
+    axes.autoscale_view()
+    axes.grid()
+    axes.ticklabel_format(style='sci', axis='y', scilimits=(0, 0))
+
+
+def _render_flux(job):
+    """Render flux to an image file with the non-interactive Agg backend"""
+    (filename, mesh, flux, dpi) = job
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    _draw_flux(figure.add_subplot(1, 1, 1), mesh, flux)
+    figure.savefig(filename, dpi=dpi)
+    return filename
+
+
+def render_flux(filename, mesh, flux, dpi=100, background=False):
+    """Render the flux of all time steps of each electrode to an image file
+
+    Rendering uses the Agg backend without pyplot, so it works on headless
+    workers. In the background it runs in a separate process, so that it
+    does not hold up the computation.
+
+    :param filename: image file to write, its extension sets the format
+    :param mesh: mesh regions
+    :param flux: (time x location) flux of each electrode
+    :param dpi: resolution of the image
+    :param background: render in a separate process
+    :type filename: string
+    :type mesh: :class:`SimMesh`
+    :type flux: dict
+    :type dpi: integer
+    :type background: bool
+    :return: name of the image file, or the rendering process in the
+        background
+    :rtype: string or :class:`multiprocessing.Process`"""
+    job = (filename, dict((name, getattr(mesh, name)) for name in flux),
+           dict((name, np.asarray(value)) for (name, value) in flux.items()),
+           dpi)
+    if not background:
+        return _render_flux(job)
+
+    import multiprocessing
+    process = multiprocessing.Process(target=_render_flux, args=(job,))
+    process.start()
+    return process
+
+
+def plot_j(time, data, mesh, params, filename=None, background=False):
+    """Plot the reaction flux of each electrode and print its rms error
+
+    :param time: time of each step
+    :param data: (time x location) simulation data
+    :param mesh: mesh regions
+    :param params: parameters of the cell constants and electrodes
+    :param filename: image file to render to instead of showing the plot
+    :param background: render the image in a separate process
+    :type time: list of floats
+    :type data: :class:`SimData`
+    :type mesh: :class:`SimMesh`
+    :type params: dict
+    :type filename: string
+    :type background: bool
+    :return: as :func:`render_flux` when rendering to a file
+    :rtype: string or :class:`multiprocessing.Process`"""
+    flux = electrode_flux(data, mesh, params)
+    errors = validate_flux(data, mesh, params, time, flux=flux)
+    print('Neg rms: {}'.format(errors['rms'][errors['domain'] == 'neg']))
+    print('Pos rms: {}'.format(errors['rms'][errors['domain'] == 'pos']))
+    if filename is not None:
+        return render_flux(filename, mesh, flux, background=background)
+
+    import matplotlib.pyplot as plt
+    _draw_flux(plt.gca(), dict((name, getattr(mesh, name)) for name in flux),
+               flux)
     plt.show()
 
 
 def main():
     print('Loading Cell Parameters')
-    params = dict()
     time = [5, 15, 25, 35, 45]
-    sheet = ldp.read_excel(
-        '../tests/gold_standard/GuAndWang_parameter_list.xlsx', 0)
-    (ncol, pcol) = (2, 3)
-    params['const'] = ldp.load_params(sheet, range(7, 15), ncol, pcol)
-    params['neg'] = ldp.load_params(sheet, range(18, 43), ncol, pcol)
-    params['sep'] = ldp.load_params(sheet, range(47, 52), ncol, pcol)
-    params['pos'] = ldp.load_params(sheet, range(55, 75), ncol, pcol)
+    params = ldp.load_param_bundle(
+        '../tests/gold_standard/GuAndWang_parameter_list.xlsx',
+        PARAMETER_LAYOUT, 0, ncols=2, pcols=3)
 
     comsol = ldp.load('../tests/gold_standard/guwang2.npz')
 
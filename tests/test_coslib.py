@@ -8,7 +8,13 @@ test_coslib
 Tests for `coslib` module.
 """
 
+import os
+import json
+import sys
+import subprocess
+
 import pytest
+import numpy as np
 
 from contextlib import contextmanager
 from click.testing import CliRunner
@@ -16,6 +22,9 @@ from click.testing import CliRunner
 from coslib import coslib
 from coslib import cli
 
+from .test_ldp import WORKBOOK
+from .test_ttp import comsol_data
+
 
 class TestCoslib(object):
 
@@ -28,12 +37,47 @@ class TestCoslib(object):
 
     def test_command_line_interface(self):
         runner = CliRunner()
-        result = runner.invoke(cli.main)
-        assert result.exit_code == 0
-        assert 'coslib.cli.main' in result.output
         help_result = runner.invoke(cli.main, ['--help'])
         assert help_result.exit_code == 0
         assert '--help  Show this message and exit.' in help_result.output
+        for command in ('convert', 'params', 'flux'):
+            assert command in help_result.output
+
+    def test_convert_and_flux(self, tmpdir):
+        archive = str(tmpdir.join('export.npz'))
+        np.savez(archive, **comsol_data(3))
+        runner = CliRunner()
+        result = runner.invoke(
+            cli.main, ['convert', archive, '-o', str(tmpdir)])
+        assert result.exit_code == 0
+        assert tmpdir.join('export', 'metadata.npz').check()
+
+        env = {'COSLIB_CACHE_DIR': str(tmpdir.join('cache'))}
+        result = runner.invoke(cli.main, [
+            'flux', str(tmpdir.join('export')), archive, '-p', WORKBOOK,
+            '-t', '0.1', '-o', str(tmpdir.join('flux')), '-j', '2',
+            '--json', str(tmpdir.join('errors.json'))], env=env)
+        assert result.exit_code == 0
+        assert result.output.count('rms') == 4
+        with open(str(tmpdir.join('errors.json'))) as report:
+            records = json.load(report)
+        assert len(records) == 4
+        assert set(records[0]) >= {'dataset', 'domain', 'rms', 'max_abs'}
+        assert np.load(str(tmpdir.join('flux', 'export_jneg.npy'))).shape \
+            == (1, 81)
+
+    def test_lazy_imports(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ)
+        env['PYTHONPATH'] = os.pathsep.join(
+            [root, os.path.join(root, 'coslib')])
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys\n'
+            'from coslib import ldp, ttp\n'
+            'print([x for x in ("xlrd", "numexpr", "scipy", "matplotlib")'
+            ' if x in sys.modules])'], env=env)
+        assert output.decode('utf-8').strip() == '[]'
 
     @classmethod
     def teardown_class(cls):
@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_execution
+----------------------------------
+
+Tests for `execution` module.
+"""
+
+import os
+import threading
+import multiprocessing
+
+import pytest
+import numexpr as ne
+import numpy as np
+
+from coslib import execution
+from coslib import ldp
+from coslib import ttp
+
+from .test_ttp import comsol_data
+
+WORKBOOK = os.path.join(os.path.dirname(__file__), 'gold_standard',
+                        'GuAndWang_parameter_list.xlsx')
+
+
+def test_from_environ():
+    config = execution.Config.from_environ({
+        'COSLIB_NUM_THREADS': '2', 'COSLIB_EXECUTOR': 'process',
+        'COSLIB_WORKERS': '3'})
+    assert (config.num_threads, config.executor, config.workers) == (
+        2, 'process', 3)
+    assert config.pool_size(10) == 3 and config.pool_size(2) == 2
+    assert execution.Config.from_environ({}).pool_size(10) == 1
+    with pytest.raises(ValueError):
+        execution.Config.from_environ({'COSLIB_EXECUTOR': 'gpu'})
+
+
+def test_configure():
+    threads = ne.get_num_threads()
+    previous = execution.config
+    with execution.configure(num_threads=2, executor='thread') as config:
+        assert execution.config is config
+        assert ne.get_num_threads() == 2
+        assert config.workers == previous.workers
+    assert execution.config is previous
+    assert ne.get_num_threads() == threads
+
+
+def test_shards():
+    assert execution.shards(10, 3) == [slice(0, 3), slice(3, 6),
+                                       slice(6, 10)]
+    assert execution.shards(2, 5) == [slice(0, 1), slice(1, 2)]
+
+
+def test_pool_reuse():
+    with execution.configure(executor='thread', workers=2) as config:
+        pool = config.pool()
+        assert config.pool() is pool
+        assert execution.pool_map(abs, [-1, -2]) == [1, 2]
+        assert config.pool() is pool
+    assert config._pool == (None, None)
+
+
+def test_small_jobs():
+    threads = []
+
+    def record(value):
+        threads.append(threading.current_thread())
+        return value
+
+    with execution.configure(executor='thread', workers=2) as config:
+        assert execution.pool_map(record, [1, 2], elements=10) == [1, 2]
+        assert config._pool == (None, None)
+    assert threads == [threading.current_thread()]*2
+
+
+def _nested_map(value):
+    return execution.pool_map(abs, [-value, value])
+
+
+def test_process_in_worker():
+    with execution.configure(executor='process', workers=2):
+        pool = multiprocessing.Pool(2)
+        try:
+            results = pool.map(_nested_map, [1, 2])
+        finally:
+            pool.close()
+            pool.join()
+    assert results == [[1, 1], [2, 2]]
+
+
+def test_expression_threads():
+    (fun,) = ldp._fun_to_lambda('@(x) 3*x./(1+x)')
+    x = np.linspace(0, 1, 10001)
+    expected = fun(x)
+    results = []
+
+    def evaluate():
+        results.extend(np.array_equal(fun(x), expected) for _ in range(50))
+
+    threads = [threading.Thread(target=evaluate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 200 and all(results)
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process'])
+def test_electrode_flux(executor, monkeypatch):
+    monkeypatch.setattr(execution, 'MIN_POOL_ELEMENTS', 0)
+    data = comsol_data(7)
+    mesh = ttp.region(data['mesh'])
+    sim = ttp.assemble_comsol(np.arange(7)/10.0, data)
+    params = ldp.load_blocks(ldp.read_excel(WORKBOOK, 0),
+                             ttp.PARAMETER_LAYOUT)
+    expected = ttp.electrode_flux(sim, mesh, params)
+    with execution.configure(num_threads=1, executor=executor, workers=3):
+        flux = ttp.electrode_flux(sim, mesh, params)
+    for name in ('neg', 'pos'):
+        assert flux[name].shape == expected[name].shape
+        assert len(flux[name]) == 7
+        assert np.array_equal(flux[name], expected[name], equal_nan=True)
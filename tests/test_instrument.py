@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_instrument
+----------------------------------
+
+Tests for `instrument` module.
+"""
+
+import json
+
+import numpy as np
+
+from coslib import instrument
+from coslib import ldp
+from coslib import ttp
+
+from .test_ldp import WORKBOOK
+from .test_ttp import comsol_data
+
+
+def test_disabled_by_default():
+    instrument.stats.reset()
+    ttp.region(np.linspace(0, 3, 31))
+    assert not instrument.stats.enabled
+    assert instrument.stats.summary() == {}
+
+
+def test_profile():
+    data = comsol_data(2)
+    with instrument.profile() as stats:
+        sim = ttp.assemble_comsol([0, 0.1], data)
+        ttp.region(data['mesh'])
+        ttp.region(data['mesh'])
+        ldp._fun_to_lambda('@(x)(2.*x)')[0](np.arange(5.))
+    assert not instrument.stats.enabled
+
+    summary = stats.summary()
+    assert summary['ttp.region']['calls'] == 2
+    assert summary['ttp.assemble_comsol']['elements'] >= sim.block.size
+    assert summary['ttp.assemble_comsol']['max_bytes'] >= sim.block.nbytes
+    assert summary['ldp._Expression.__call__']['calls'] == 1
+    assert json.loads(stats.to_json()) == summary
+    assert stats.table().splitlines()[1].startswith('ttp.assemble_comsol')
+
+
+def test_sparse_elements():
+    sheet = ldp.read_excel(WORKBOOK, 0)
+    assert isinstance(sheet, ldp.SparseSpreadsheet)
+    with instrument.profile(memory=False) as stats:
+        ldp.load_section(sheet, range(7, 15), 3)
+    assert not sheet._dense
+    assert stats.summary()['ldp.load_section']['elements'] >= len(sheet.row)
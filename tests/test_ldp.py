@@ -0,0 +1,467 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_ldp
+----------------------------------
+
+Tests for `ldp` module.
+"""
+
+import os
+import shutil
+import zipfile
+import tempfile
+
+import pytest
+import numpy as np
+
+import xlrd
+from coslib import ldp
+from coslib import ttp
+
+GOLD = os.path.join(os.path.dirname(__file__), 'gold_standard')
+WORKBOOK = os.path.join(GOLD, 'GuAndWang_parameter_list.xlsx')
+
+
+class TestSpreadsheet(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.sheet = ldp.read_excel(WORKBOOK, 0, sparse=False)
+
+    def test_storage(self):
+        assert self.sheet.numbers.dtype == np.float64
+        assert self.sheet.ctypes.dtype == np.int8
+        assert self.sheet.size() == self.sheet.ctypes.shape
+
+    def test_cell(self):
+        cell = self.sheet.cell(6, 1)
+        assert cell.ctype == ldp.TEXT
+        assert cell.value == 'Acell'
+        cell = self.sheet.cell(7, 2)
+        assert cell.ctype == ldp.NUMBER
+        assert cell.value == 298.15
+
+    def test_load_section_view(self):
+        section = ldp.load_section(self.sheet, range(7, 15), 3)
+        assert section.size() == (8, 1)
+        assert np.shares_memory(section.numbers, self.sheet.numbers)
+        assert section.ravel()[1] == 298.15
+
+    def test_load_params(self):
+        params = ldp.load_params(self.sheet, range(7, 15), 2, 3)
+        assert params['Tref'] == 298.15
+        assert params['ce0'] == 2000.0
+        assert np.isclose(params['kappa_ref'][0](1000.0), 0.204755)
+
+    def test_load_blocks(self):
+        layout = {'const': range(7, 15), 'neg': range(18, 43),
+                  'sep': range(47, 52), 'pos': range(55, 75)}
+        blocks = ldp.load_blocks(self.sheet, layout, ncols=2, pcols=3)
+        assert sorted(blocks) == sorted(layout)
+        for (block, rows) in layout.items():
+            params = ldp.load_params(self.sheet, rows, 2, 3)
+            assert sorted(blocks[block]) == sorted(params)
+            for (name, value) in params.items():
+                if not isinstance(value, list):
+                    assert blocks[block][name] == value
+
+    @classmethod
+    def teardown_class(cls):
+        pass
+
+
+class TestSparseSpreadsheet(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.dense = ldp.read_excel(WORKBOOK, 0, sparse=False)
+        cls.sheet = ldp.read_excel(WORKBOOK, 0)
+
+    def test_storage(self):
+        assert isinstance(self.sheet, ldp.SparseSpreadsheet)
+        assert self.sheet.density() <= ldp.SPARSE_DENSITY
+        assert len(self.sheet.row) == np.count_nonzero(self.dense.ctypes)
+        assert self.sheet.size() == self.dense.size()
+        assert np.array_equal(self.sheet.ctypes, self.dense.ctypes)
+
+    def test_cell(self):
+        for (xpos, ypos) in ((6, 1), (7, 2), (0, 10), (-1, -1)):
+            cell = self.sheet.cell(xpos, ypos)
+            expected = self.dense.cell(xpos, ypos)
+            assert (cell.ctype, cell.value) == (expected.ctype,
+                                                expected.value)
+
+    def test_section(self):
+        assert self.sheet.ravel() == self.dense.ravel()
+        for rows in (range(7, 15), [60, 8, 8, 1], 3):
+            section = ldp.load_section(self.sheet, rows, [4, 2, 3])
+            expected = ldp.load_section(self.dense, rows, [4, 2, 3])
+            assert section.size() == expected.size()
+            assert section.ravel() == expected.ravel()
+
+    def test_load_blocks(self):
+        blocks = ldp.load_blocks(self.sheet, ttp.PARAMETER_LAYOUT)
+        params = ldp.load_blocks(self.dense, ttp.PARAMETER_LAYOUT)
+        for (block, values) in params.items():
+            assert sorted(blocks[block]) == sorted(values)
+            for (name, value) in values.items():
+                if not isinstance(value, list):
+                    assert blocks[block][name] == value
+
+    def test_set_cells(self):
+        sheet = ldp.SparseSpreadsheet(ldp.NUMBER)
+        sheet.set_cells([(2, 1, xlrd.sheet.Cell(ldp.NUMBER, 1.5)),
+                         (0, 0, xlrd.sheet.Cell(ldp.TEXT, 'a'))], (4, 3))
+        assert sheet.size() == (4, 3)
+        assert sheet.value(0, 0) == 'a'
+        assert sheet.value(1, 1) == ''
+        numbers = ldp.load_section(sheet, range(2, 4), 2)
+        assert numbers.shape == (2, 1) and numbers[1, 0] == 1.5
+        assert np.isnan(numbers[0, 0])
+
+    def test_dense_arrays(self):
+        sheet = ldp.SparseSpreadsheet(ldp.NUMBER)
+        sheet.set_cells([(1, 1, xlrd.sheet.Cell(ldp.NUMBER, 1.5))])
+        assert sheet.ctypes is sheet.ctypes
+        assert sheet.numbers[1, 1] == 1.5 and sheet.text[1, 1] == -1
+        sheet.set_cells([(0, 1, xlrd.sheet.Cell(ldp.TEXT, 'a'))])
+        assert sheet.ctypes.shape == (1, 2)
+        assert sheet.ctypes[0, 1] == ldp.TEXT and sheet.text[0, 1] == 0
+
+
+class TestExpressions(object):
+
+    def test_fun_to_lambda(self):
+        (fun, dfun) = ldp._fun_to_lambda('{(@(x) x.^2), (@(y) 2.*y)}')
+        assert np.allclose(fun(np.arange(3.0)), [0, 1, 4])
+        assert dfun(1.5) == 3.0
+
+    def test_program_cache(self):
+        entry = '@(x) 3*x./(1+x)'
+        (first,) = ldp._fun_to_lambda(entry)
+        (second,) = ldp._fun_to_lambda(entry)
+        assert first(1.0) == second(1.0) == 1.5
+        assert first._program is second._program
+
+    def test_fused(self):
+        fun = ldp._fun_to_lambda(
+            '{(@(x,T) x.*T + where(x > 1, x, 0)), (@(x, T) exp(-x./T)), 2.5}')
+        assert [x.variables for x in fun] == [('x', 'T'), ('x', 'T'), ()]
+        (x, temp) = (np.arange(3.0), np.array([[1.0], [2.0]]))
+        values = fun(x, temp)
+        assert values.shape == (3, 2, 3)
+        assert np.allclose(values[0], x*temp + np.where(x > 1, x, 0))
+        assert np.allclose(values[1], np.exp(-x/temp))
+        assert np.all(values[2] == 2.5)
+        assert np.allclose(fun[1](x, 2.0), values[1, 1])
+        out = np.empty((3, 2, 3))
+        assert fun(x, temp, out=out) is out
+
+    def test_fused_scalars(self):
+        fun = ldp._fun_to_lambda('{@(x) x.^2, @(x) 2.*x, 1.5}')
+        assert np.array_equal(fun(2.0), [4.0, 4.0, 1.5])
+        assert np.array_equal(fun(np.float64(3.0)), [9.0, 6.0, 1.5])
+
+
+class TestParamBundle(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        cls.layout = {'const': range(7, 15), 'pos': range(55, 75)}
+
+    def test_round_trip(self):
+        fresh = ldp.load_param_bundle(
+            WORKBOOK, self.layout, cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 1
+        cached = ldp.load_param_bundle(
+            WORKBOOK, self.layout, cache_dir=self.cache_dir)
+        sheet = ldp.read_excel(WORKBOOK, 0)
+        for (block, rows) in self.layout.items():
+            expected = ldp.load_params(sheet, rows, 2, 3)
+            for params in (fresh[block], cached[block]):
+                assert sorted(params) == sorted(expected)
+                for (name, value) in expected.items():
+                    if isinstance(value, list):
+                        assert params[name][0](0.4) == value[0](0.4)
+                    else:
+                        assert params[name] == value
+
+    def test_layout_key(self):
+        ldp.load_param_bundle(WORKBOOK, {'sep': range(47, 52)},
+                              cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 2
+
+    def test_corrupt_bundle(self):
+        layout = {'sep': range(47, 52)}
+        expected = ldp.load_param_bundle(WORKBOOK, layout,
+                                         cache_dir=self.cache_dir)
+        for size in (0, 10, 200):
+            for name in os.listdir(self.cache_dir):
+                bundle = os.path.join(self.cache_dir, name)
+                with open(bundle, 'rb') as contents:
+                    data = contents.read()
+                with open(bundle, 'wb') as contents:
+                    contents.write(data[:size])
+            params = ldp.load_param_bundle(WORKBOOK, layout,
+                                           cache_dir=self.cache_dir)
+            assert params == expected
+        assert len(os.listdir(self.cache_dir)) == 2
+        params = ldp.load_param_bundle(WORKBOOK, self.layout,
+                                       cache_dir=self.cache_dir)
+        assert params['const']['Tref'] == 298.15
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.cache_dir)
+
+
+class TestTabulate(object):
+
+    @classmethod
+    def setup_class(cls):
+        sheet = ldp.read_excel(WORKBOOK, 0)
+        cls.params = ldp.load_params(sheet, range(18, 43), 2, 3)
+        cls.cache_dir = tempfile.mkdtemp()
+
+    def test_tabulate(self):
+        uocp = self.params['Uocp'][0]
+        table = ldp.tabulate(uocp, (0, 1), points=101)
+        x = np.linspace(0, 1, 801)
+        assert len(table.values) == 101
+        assert np.allclose(table(table.grid), uocp(table.grid))
+        assert np.isclose(np.max(np.abs(table(x) - uocp(x))),
+                          table.max_error)
+        assert table(-1) == table(0) and table(2) == table(1)
+        assert table(np.zeros((2, 3))).shape == (2, 3)
+        values = table([np.nan, 0.5, np.inf])
+        assert np.isnan(values[0]) and np.isnan(table(np.nan))
+        assert values[1] == table(0.5) and values[2] == table(1)
+
+    def test_tolerance(self):
+        uocp = self.params['Uocp'][0]
+        table = ldp.tabulate(uocp, (0, 1), points=101, tolerance=1e-3)
+        assert table.max_error <= 1e-3
+        assert len(table.values) > 101
+        x = np.random.RandomState(0).uniform(0, 1, 10000)
+        assert np.max(np.abs(table(x) - uocp(x))) <= 1e-3
+
+    def test_tabulate_params(self):
+        tabulated = ldp.tabulate_params(self.params, {'Uocp': (0, 1)}, 201)
+        assert isinstance(tabulated['Uocp'][0], ldp.Interpolant)
+        assert tabulated['Uocp'][1] is self.params['Uocp'][1]
+        assert not isinstance(self.params['Uocp'][0], ldp.Interpolant)
+        out = np.empty((2, 5))
+        tabulated['Uocp'](np.linspace(0, 1, 5), out=out)
+        assert np.allclose(out[0], tabulated['Uocp'][0](np.linspace(0, 1, 5)))
+
+    def test_bundle(self):
+        tables = {'neg': {'Uocp': (0, 1)}}
+        layout = {'neg': range(18, 43)}
+        fresh = ldp.load_param_bundle(WORKBOOK, layout, tables=tables,
+                                      points=201, cache_dir=self.cache_dir)
+        cached = ldp.load_param_bundle(WORKBOOK, layout, tables=tables,
+                                       points=201, cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 1
+        (fresh, cached) = (fresh['neg']['Uocp'][0], cached['neg']['Uocp'][0])
+        assert isinstance(cached, ldp.Interpolant)
+        assert np.array_equal(cached.values, fresh.values)
+        assert cached.max_error == fresh.max_error
+        ldp.load_param_bundle(WORKBOOK, layout, cache_dir=self.cache_dir)
+        assert len(os.listdir(self.cache_dir)) == 2
+
+    def test_bundle_tolerance(self):
+        tables = {'neg': {'Uocp': (0, 1)}, 'pos': {'Uocp': (0.3, 0.99)}}
+        (fresh, cached) = [ldp.load_param_bundle(
+            WORKBOOK, ttp.PARAMETER_LAYOUT, tables=tables, points=101,
+            tolerance=1e-3, cache_dir=self.cache_dir) for _ in range(2)]
+        lengths = set()
+        for block in tables:
+            table = cached[block]['Uocp'][0]
+            assert isinstance(table, ldp.Interpolant)
+            assert table.max_error <= 1e-3
+            assert np.array_equal(table.values,
+                                  fresh[block]['Uocp'][0].values)
+            lengths.add(len(table.values))
+        assert len(lengths) == 2
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.cache_dir)
+
+
+class TestWorkbookCache(object):
+
+    def test_reuse(self):
+        cache = ldp.WorkbookCache(maxsize=1)
+        book = cache.open(WORKBOOK)
+        assert cache.open(WORKBOOK) is book
+        assert cache.sheet_names(WORKBOOK)[0] == 'Parameters'
+        cache.clear()
+        assert len(cache) == 0
+
+    def test_sheet_names(self):
+        names = ldp.read_excel(WORKBOOK, cache=False)
+        assert names == ['Parameters', 'OCV', 'Instructions', 'Reference']
+
+    def test_streamed(self):
+        ldp.workbook_cache.clear()
+        sheet = ldp.read_excel(WORKBOOK, 0)
+        ldp.read_excel(WORKBOOK, 'OCV')
+        assert ldp.read_excel(WORKBOOK)[1] == 'OCV'
+        assert len(ldp.workbook_cache) == 1
+        book = ldp.workbook_cache.open(WORKBOOK)
+        assert sorted(book._sheets) == ['OCV', 'Parameters']
+        assert isinstance(book._sheets['Parameters'][1],
+                          ldp.SparseSpreadsheet)
+        sheet.cell_numbers[:] = 0
+        assert ldp.read_excel(WORKBOOK, 0).ravel() == \
+            ldp.read_excel(WORKBOOK, 0, cache=False).ravel()
+        for stop in (1, 6, 20, 1000):
+            cached = ldp.read_excel(WORKBOOK, 0, stop=stop)
+            expected = ldp.read_excel(WORKBOOK, 0, cache=False, stop=stop)
+            assert cached.size() == expected.size()
+            assert cached.ravel() == expected.ravel()
+
+        ldp.workbook_cache.clear()
+        for stop in (10, 20, 30, 40, 5):
+            cached = ldp.read_excel(WORKBOOK, 0, stop=stop)
+            assert cached.size() == ldp.read_excel(
+                WORKBOOK, 0, cache=False, stop=stop).size()
+        book = ldp.workbook_cache.open(WORKBOOK)
+        assert list(book._sheets) == ['Parameters']
+        assert book._sheets['Parameters'][0] == 40
+        ldp.workbook_cache.clear()
+
+
+class TestReadSheets(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.copy = os.path.join(cls.tempdir, 'copy.xlsx')
+        shutil.copy(WORKBOOK, cls.copy)
+        cls.requests = [(WORKBOOK, 0), (WORKBOOK, 'OCV'), (cls.copy, 0),
+                        (WORKBOOK, 0)]
+
+    def check(self, sheets):
+        assert sorted(sheets, key=str) == sorted(set(self.requests), key=str)
+        assert sheets[(self.copy, 0)].values == sheets[(WORKBOOK, 0)].values
+        assert sheets[(WORKBOOK, 'OCV')].values == \
+            ldp.read_excel(WORKBOOK, 'OCV').values
+
+    def test_threads(self):
+        self.check(ldp.read_sheets(self.requests, workers=2))
+
+    def test_processes(self):
+        self.check(ldp.read_sheets(self.requests, workers=2, processes=True))
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.tempdir)
+
+
+class TestXlsxReader(object):
+
+    SHEET = (
+        '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/'
+        '2006/main"><sheetData>'
+        '<row r="1"><c r="A1" t="s"><v>0</v></c><c r="C1"><v>2.5</v></c>'
+        '</row><row r="3"><c r="B3" t="b"><v>1</v></c>'
+        '<c r="C3" t="e"><v>#DIV/0!</v></c>'
+        '<c r="D3" t="inlineStr"><is><t>inline</t></is></c>'
+        '<c r="E3" s="1"><v>42000</v></c><c r="F3" s="2"/></row>'
+        '<row r="4"><c r="A4" t="s"><v>1</v></c><c r="B4" s="2"/>'
+        '<c r="C4"><f>B1*2</f><v></v></c><c r="D4" t="str"><f>A1</f><v/></c>'
+        '</row>'
+        '</sheetData></worksheet>')
+
+    @classmethod
+    def setup_class(cls):
+        cls.tempdir = tempfile.mkdtemp()
+        cls.workbook = os.path.join(cls.tempdir, 'types.xlsx')
+        ns = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+        with zipfile.ZipFile(cls.workbook, 'w') as archive:
+            archive.writestr('xl/workbook.xml', (
+                '<workbook xmlns="%s"><sheets><sheet name="Types" '
+                'sheetId="1"/></sheets></workbook>' % ns))
+            archive.writestr('xl/worksheets/sheet1.xml', cls.SHEET)
+            archive.writestr('xl/sharedStrings.xml', (
+                '<sst xmlns="%s"><si><t>first</t></si><si><r><t>rich </t>'
+                '</r><r><t>text</t></r></si></sst>' % ns))
+            archive.writestr('xl/styles.xml', (
+                '<styleSheet xmlns="%s"><numFmts><numFmt numFmtId="164" '
+                'formatCode="0.00&quot;d&quot;"/></numFmts><cellXfs>'
+                '<xf numFmtId="0"/><xf numFmtId="14"/><xf numFmtId="164"/>'
+                '</cellXfs></styleSheet>' % ns))
+
+    def test_cell_types(self):
+        sheet = ldp.read_excel(self.workbook, 'Types', sparse=False)
+        assert sheet.size() == (4, 5)
+        assert sheet.values[0] == ['first', '', 2.5, '', '']
+        assert sheet.values[3] == ['rich text', '', '', '', '']
+        assert list(sheet.ctypes[3]) == [ldp.TEXT] + [ldp.EMPTY] * 4
+        assert sheet.values[1] == [''] * 5
+        assert list(sheet.ctypes[2]) == [ldp.EMPTY, ldp.BOOLEAN, ldp.ERROR,
+                                         ldp.TEXT, ldp.DATE]
+        assert sheet.values[2] == ['', 1, 7, 'inline', 42000.0]
+
+    def test_matches_xlrd(self):
+        for name in ('Parameters', 'OCV'):
+            sheet = ldp.read_excel(WORKBOOK, name, sparse=False)
+            expected = ldp.read_excel(WORKBOOK, name, backend='xlrd',
+                                      sparse=False)
+            assert sheet.values == expected.values
+            assert np.array_equal(sheet.ctypes, expected.ctypes)
+
+    def test_stop(self):
+        with ldp.XlsxReader(WORKBOOK) as reader:
+            assert reader.sheet_names()[1] == 'OCV'
+            rows = list(reader.rows(0, stop=8))
+            assert len(rows) == 8
+            assert rows[6][1].value == 'Acell'
+        with ldp.XlsxReader(self.workbook) as reader:
+            assert len(list(reader.rows(0, stop=1))) == 1
+            # shared strings are only parsed as far as the rows read need
+            assert reader._strings == ['first']
+        sheet = ldp.read_excel(WORKBOOK, 0, stop=8, sparse=False)
+        assert sheet.size() == (8, 11)
+
+    def test_backend(self):
+        with pytest.raises(ValueError):
+            ldp.read_excel(WORKBOOK, 0, backend='csv')
+        with pytest.raises(KeyError):
+            ldp.read_excel(WORKBOOK, 'Missing')
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.tempdir)
+
+
+class TestReadCsv(object):
+
+    def test_numeric_window(self):
+        sheet = ldp.read_csv(
+            os.path.join(GOLD, 'v.csv'), start=9, stop=13, assume=ldp.NUMBER)
+        data = ldp.load_section(sheet)
+        assert data.shape == (5, 2)
+        assert np.allclose(data[:, 0], [0, 0.1, 0.2, 0.3, 0.4])
+
+    def test_numeric_stop(self):
+        path = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(path, 'window.csv')
+            with open(filename, 'w') as csvfile:
+                csvfile.write('% x,y\n0,1\n2,3\n4,5\nnot,numeric\n')
+            sheet = ldp.read_csv(filename, start=2, stop=4,
+                                 assume=ldp.NUMBER)
+            assert np.array_equal(sheet.numbers, [[0, 1], [2, 3], [4, 5]])
+            with open(filename, 'w') as csvfile:
+                csvfile.write('% x,y\n0,1\n')
+            sheet = ldp.read_csv(filename, start=2, assume=ldp.NUMBER)
+            assert sheet.numbers.shape == (1, 2)
+            assert sheet.numbers.base is None
+        finally:
+            shutil.rmtree(path)
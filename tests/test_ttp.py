@@ -0,0 +1,297 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+test_ttp
+----------------------------------
+
+Tests for `ttp` module.
+"""
+
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from coslib import ldp
+from coslib import ttp
+
+GOLD = os.path.join(os.path.dirname(__file__), 'gold_standard')
+
+
+def comsol_data(nframes=4):
+    """Build a COMSOL-like export on the gold standard mesh
+
+    Solid phase variables repeat the interface nodes at rows 80 and 202 of
+    each frame, as in the COMSOL exports."""
+    mesh = np.loadtxt(os.path.join(GOLD, 'mesh.csv'))
+    solid = np.insert(mesh, [81, 201], [mesh[80], mesh[200]])
+    data = {'mesh': mesh}
+    for (k, name) in enumerate(('ce', 'cse', 'phie', 'phis', 'j')):
+        x = solid if name in ('cse', 'phis', 'j') else mesh
+        frames = [np.column_stack((x, (k+1)*100 + t + x))
+                  for t in range(nframes)]
+        data[name] = np.concatenate(frames)
+
+    return data
+
+
+class TestFrameIndex(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.data = comsol_data()
+
+    def test_offsets(self):
+        frames = ttp.FrameIndex(self.data['ce'])
+        assert len(frames) == 4
+        assert np.all(frames.stop - frames.start == len(self.data['mesh']))
+        assert np.allclose(frames.time, [0, 0.1, 0.2, 0.3])
+
+    def test_frame(self):
+        frames = ttp.FrameIndex(self.data['ce'])
+        frame = frames.frame(0.3)
+        assert np.shares_memory(frame, self.data['ce'])
+        assert np.allclose(frame[:, 1], 103 + self.data['mesh'])
+
+    def test_missing_time(self):
+        frames = ttp.FrameIndex(self.data['ce'])
+        for time in (0.15, 0.4, -0.1):
+            try:
+                frames.index(time)
+            except ValueError:
+                continue
+            assert False, time
+
+    def test_get_var(self):
+        var = ttp.get_var(self.data['cse'], 0.2, delete=[80, 202])
+        assert var.shape == (1, len(self.data['mesh']))
+        assert np.allclose(var[0], 202 + self.data['mesh'])
+        var = ttp.get_var(ttp.FrameIndex(self.data['ce']), 0.1, location=1.0)
+        assert np.allclose(var, [[102.0]])
+
+    @classmethod
+    def teardown_class(cls):
+        pass
+
+
+class TestAssembleComsol(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.data = comsol_data()
+        cls.time = [0.1, 0.3]
+
+    def test_assemble(self):
+        sim = ttp.assemble_comsol(self.time, self.data)
+        mesh = self.data['mesh']
+        assert sim.ce.shape == sim.j.shape == (2, len(mesh))
+        assert np.allclose(sim.cse, [201 + mesh, 203 + mesh])
+        assert np.allclose(sim.j[:, 0], [501, 503])
+
+    def test_sim_data_views(self):
+        sim = ttp.assemble_comsol(self.time, self.data)
+        mesh = ttp.region(self.data['mesh'])
+        assert sim.block.shape == (5, 2, len(self.data['mesh']))
+        assert np.shares_memory(sim.ce, sim.block)
+        for (time_index, location) in ((slice(None), mesh.neg),
+                                       (1, mesh.index('pos'))):
+            selection = sim.get_sim_data(time_index, location)
+            assert np.shares_memory(selection.block, sim.block)
+        selection = sim.get_sim_data(slice(None), [0, 5])
+        assert np.array_equal(selection.cse, sim.cse[:, [0, 5]])
+
+    def test_dataset(self):
+        path = tempfile.mkdtemp()
+        try:
+            ldp.save_dataset(path, self.data)
+            dataset = ldp.load_dataset(path)
+            assert isinstance(dataset['ce'], np.memmap)
+            assert np.array_equal(dataset['mesh'], self.data['mesh'])
+            assert len(dataset.frame_starts('cse')) == 4
+            sim = ttp.assemble_comsol(self.time, dataset)
+            expected = ttp.assemble_comsol(self.time, self.data)
+            assert np.array_equal(sim.cse, expected.cse)
+        finally:
+            shutil.rmtree(path)
+
+    def test_workers(self):
+        serial = ttp.assemble_comsol(self.time, self.data)
+        threaded = ttp.assemble_comsol(self.time, self.data, workers=2)
+        for name in ('ce', 'cse', 'phie', 'phis', 'j'):
+            assert np.array_equal(getattr(serial, name),
+                                  getattr(threaded, name))
+
+
+class TestStreamComsol(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.data = comsol_data(5)
+        cls.path = tempfile.mkdtemp()
+        cls.exports = dict()
+        for name in ttp.SIM_VARIABLES:
+            cls.exports[name] = os.path.join(cls.path, name + '.csv')
+            with open(cls.exports[name], 'w') as export:
+                export.write('% Model,gold.mph\n% x,' + name + '\n')
+                np.savetxt(export, cls.data[name], delimiter=',')
+
+    def test_iter_frames(self):
+        frames = list(ttp.iter_frames(self.exports['cse'], chunk=100))
+        assert len(frames) == 5
+        assert np.isclose(frames[-1][0], 0.4)
+        assert np.array_equal(np.concatenate([x for (_, x) in frames]),
+                              self.data['cse'])
+
+    def test_stream(self):
+        expected = ttp.assemble_comsol([0, 0.1, 0.2, 0.3, 0.4], self.data)
+        results = list(ttp.stream_comsol(self.exports, chunk=97))
+        assert len(results) == 5
+        for (k, (_, data)) in enumerate(results):
+            assert np.array_equal(data.block[:, 0], expected.block[:, k])
+
+    def test_write_stream(self):
+        mesh = ttp.region(self.data['mesh'])
+        stages = [lambda x: x.get_sim_data(0, mesh.index('neg')),
+                  lambda x: {'ce': x.ce, 'j': x.j}]
+        output = os.path.join(self.path, 'out.csv')
+        count = ttp.write_stream(ttp.stream_comsol(self.exports, stages),
+                                 output)
+        assert count == 5
+        with open(output) as out:
+            rows = [x.split(',') for x in out.read().splitlines()]
+        assert len(rows) == 10
+        assert rows[2][:2] == ['0.1', 'ce']
+        assert len(rows[2]) == 2 + 81
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+
+class TestValidate(object):
+
+    @classmethod
+    def setup_class(cls):
+        cls.data = comsol_data(3)
+        cls.mesh = ttp.region(cls.data['mesh'])
+        cls.reference = ttp.assemble_comsol([0, 0.1, 0.2], cls.data)
+
+    def test_validate(self):
+        computed = ttp.SimData.from_block(self.reference.block + 1)
+        errors = ttp.validate(computed, self.reference, self.mesh,
+                              [0, 0.1, 0.2])
+        assert errors.dtype == ttp.VALIDATION_DTYPE
+        assert len(errors) == 5*3*3
+        assert np.allclose(errors['rms'], 1)
+        assert np.allclose(errors['max_abs'], 1)
+        rows = errors[(errors['variable'] == 'ce') &
+                      (errors['domain'] == 'sep')]
+        assert np.allclose(rows['time'], [0, 0.1, 0.2])
+        scale = np.sqrt(np.mean(np.square(
+            self.reference.ce[:, self.mesh.index('sep')]), axis=1))
+        assert np.allclose(rows['relative'], 1/scale)
+
+    def test_long_names(self):
+        mesh = ttp.region(self.data['mesh'], np.linspace(0.1, 2.9, 11))
+        names = mesh.names[9:]
+        assert names == ('domain9', 'domain10', 'domain11')
+        errors = ttp.validate(self.reference, self.reference, mesh,
+                              domains=names)
+        assert list(np.unique(errors['domain'])) == sorted(names)
+        assert errors.dtype['time'] == ttp.VALIDATION_DTYPE['time']
+
+    def test_validate_flux(self):
+        flux = {'neg': self.reference.j[:, self.mesh.index('neg')],
+                'pos': np.zeros((3, 80))}
+        errors = ttp.validate_flux(self.reference, self.mesh, None,
+                                   flux=flux)
+        assert list(errors['domain']) == ['neg']*3 + ['pos']*3
+        assert np.all(errors['rms'][:3] == 0)
+        assert np.allclose(errors['relative'][3:], 1)
+        records = ttp.validation_records(errors)
+        assert records[0]['variable'] == 'j'
+        assert records[0]['step'] == 0
+
+
+class TestRenderFlux(object):
+
+    @classmethod
+    def setup_class(cls):
+        data = comsol_data(3)
+        cls.mesh = ttp.region(data['mesh'])
+        sim = ttp.assemble_comsol([0, 0.1, 0.2], data)
+        cls.flux = dict((name, sim.j[:, cls.mesh.index(name)])
+                        for name in ('neg', 'pos'))
+        cls.path = tempfile.mkdtemp()
+
+    def test_render(self):
+        filename = os.path.join(self.path, 'flux.png')
+        assert ttp.render_flux(filename, self.mesh, self.flux) == filename
+        with open(filename, 'rb') as image:
+            assert image.read(8) == b'\x89PNG\r\n\x1a\n'
+
+    def test_background(self):
+        filename = os.path.join(self.path, 'flux.svg')
+        process = ttp.render_flux(filename, self.mesh, self.flux,
+                                  background=True)
+        process.join()
+        assert process.exitcode == 0
+        assert os.path.getsize(filename) > 0
+
+    @classmethod
+    def teardown_class(cls):
+        shutil.rmtree(cls.path)
+
+
+class TestRegion(object):
+
+    def test_gold_mesh(self):
+        mesh = ttp.region(np.loadtxt(os.path.join(GOLD, 'mesh.csv')))
+        assert (len(mesh.neg), len(mesh.sep), len(mesh.pos)) == (81, 120, 80)
+        assert mesh.index('sep') == slice(81, 201)
+        assert mesh.mask('pos').sum() == 80
+
+    def test_repeated_interfaces(self):
+        mesh = ttp.region(np.array([0, 0.5, 1, 1, 1.5, 2, 2, 2.5, 3]))
+        assert list(mesh.neg) == [0, 1, 2]
+        assert list(mesh.sep) == [3, 4, 5]
+        assert list(mesh.pos) == [6, 7, 8]
+
+    def test_boundaries(self):
+        mesh = ttp.region(np.array([0, 1, 1, 2, 3, 3, 4.0]), (1, 2, 3))
+        assert mesh.names == ('domain0', 'domain1', 'domain2', 'domain3')
+        assert [list(x) for x in mesh.domains] == [[0, 1], [2, 3], [4],
+                                                   [5, 6]]
+
+    def test_no_boundaries(self):
+        mesh = ttp.region(np.array([0, 0.5, 0.5, 1.0]), ())
+        assert mesh.names == ('domain0',)
+        assert list(mesh.domains[0]) == [0, 1, 2, 3]
+
+
+class TestReactionFlux(object):
+
+    @classmethod
+    def setup_class(cls):
+        sheet = ldp.read_excel(
+            os.path.join(GOLD, 'GuAndWang_parameter_list.xlsx'), 0)
+        cls.const = ldp.load_params(sheet, range(7, 15), 2, 3)
+        cls.params = ldp.load_params(sheet, range(18, 43), 2, 3)
+        random = np.random.RandomState(0)
+        cse = random.uniform(0, 26390, (5, 81))
+        phis = cls.params['Uocp'][0](cse/26390) + \
+            random.uniform(-0.05, 0.05, cse.shape)
+        cls.sim = ttp.SimData(random.uniform(0, 2500, cse.shape), cse,
+                              random.uniform(-0.01, 0, cse.shape), phis,
+                              np.zeros(cse.shape))
+
+    def test_batch(self):
+        batch = ttp.reaction_flux_batch(self.sim, self.params, self.const)
+        assert batch.shape == (5, 81)
+        for ind in range(5):
+            step = ttp.reaction_flux(
+                self.sim.get_sim_data(ind, slice(None)), self.params,
+                self.const)
+            assert np.allclose(batch[ind], step[0], rtol=1e-10, atol=0)